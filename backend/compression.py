@@ -0,0 +1,277 @@
+import asyncio
+import gzip
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, gzip is always available
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+# Bodies at least this large are compressed in a worker thread instead of on the event loop
+COMPRESSION_THREADPOOL_SIZE = int(os.environ.get('COMPRESSION_THREADPOOL_SIZE', '65536'))
+
+# Levels used when compressing per request vs. once for a cached entry
+DYNAMIC_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+CACHED_LEVELS = {"br": 9, "zstd": 10, "gzip": 9}
+
+
+def available_encodings() -> Tuple[str, ...]:
+    # Server preference order when the client weights encodings equally
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if level is None:
+        level = DYNAMIC_LEVELS[encoding]
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+async def compress_async(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if len(data) >= COMPRESSION_THREADPOOL_SIZE:
+        return await run_in_threadpool(compress, data, encoding, level)
+    return compress(data, encoding, level)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """Negotiated br/zstd/gzip compression for responses above a size threshold.
+
+    Responses that already carry a Content-Encoding (e.g. precompressed cache
+    entries) and streamed responses are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = scope.get("headers", [])
+        accept = _header(request_headers, b"accept-encoding")
+        encoding = negotiate_encoding(accept.decode("latin-1") if accept else None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if start_message is None:
+                await send(message)
+                return
+
+            headers = list(start_message.get("headers", []))
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or _header(headers, b"content-encoding") is not None
+                or len(body) < self.minimum_size
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = await compress_async(body, encoding)
+            headers = [
+                (key, value) for key, value in headers
+                if key.lower() not in (b"content-length", b"vary")
+            ]
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+            headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+            headers.append((b"vary", b"Accept-Encoding"))
+            start_message["headers"] = headers
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class CachedEntry:
+    def __init__(self, body: bytes, expires_at: float):
+        self.body = body
+        self.expires_at = expires_at
+        self.variants: Dict[str, "asyncio.Future[bytes]"] = {}
+
+    async def encoded(self, encoding: Optional[str], minimum_size: int) -> Tuple[bytes, Optional[str]]:
+        # Compress each variant once, the first time a client asks for it; concurrent
+        # requests for the same variant wait on the same compression
+        if encoding is None or len(self.body) < minimum_size:
+            return self.body, None
+        if encoding not in self.variants:
+            self.variants[encoding] = asyncio.ensure_future(
+                compress_async(self.body, encoding, CACHED_LEVELS[encoding])
+            )
+        try:
+            return await asyncio.shield(self.variants[encoding]), encoding
+        except Exception:
+            self.variants.pop(encoding, None)
+            raise
+
+
+class CompressedResponseCache:
+    """Small TTL/LRU cache of serialized responses plus their compressed variants.
+
+    ``generation`` changes on every ``clear()``. A caller that captured it
+    before loading its data passes it to ``set()``; if the cache was cleared
+    in the meantime the (possibly stale) body is served once but not stored.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.minimum_size = minimum_size
+        self._entries: "OrderedDict[tuple, CachedEntry]" = OrderedDict()
+        self.generation = 0
+
+    def get(self, key) -> Optional[CachedEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, body: bytes, generation: Optional[int] = None) -> CachedEntry:
+        entry = CachedEntry(body, time.monotonic() + self.ttl)
+        if generation is not None and generation != self.generation:
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+if __name__ == "__main__":
+    # Benchmark: CPU cost vs. bytes saved per encoding on a synthetic catalog page
+    import base64
+    import json
+    import random
+    import uuid
+
+    # Logos are already-compressed PNGs, so random bytes of varied size model them
+    rng = random.Random(42)
+    words = ("news", "sports", "music", "movies", "kids", "documentary", "local", "world",
+             "premier", "classic", "hits", "weather", "comedy", "drama", "science", "travel")
+
+    def channel(i):
+        logo = base64.b64encode(rng.randbytes(rng.randint(1500, 12000))).decode("ascii")
+        name = " ".join(rng.choice(words).title() for _ in range(rng.randint(1, 3)))
+        return {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": f"{name} {i}",
+            "description": " ".join(rng.choice(words) for _ in range(rng.randint(6, 25))),
+            "logo": "data:image/png;base64," + logo,
+            "urls": [
+                f"https://{rng.choice(words)}{rng.randint(1, 99)}.example.com/live/{uuid.UUID(int=rng.getrandbits(128)).hex}/index.m3u8"
+                for _ in range(rng.randint(1, 4))
+            ],
+            "category": rng.choice(["News", "Sports", "Music", "Movies", "Kids", None]),
+            "is_active": True,
+            "created_by": str(uuid.UUID(int=rng.getrandbits(128 if i % 7 else 0) or 1)),
+            "created_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00",
+            "updated_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00",
+        }
+
+    payload = json.dumps([channel(i) for i in range(1000)], separators=(",", ":")).encode("utf-8")
+    summary = json.dumps([
+        {key: row[key] for key in ("id", "name", "category")}
+        for row in json.loads(payload)
+    ], separators=(",", ":")).encode("utf-8")
+
+    for label, data in (("full listing", payload), ("summary without logos", summary)):
+        print(f"{label}: {len(data)} bytes")
+        print(f"{'encoding':<8} {'level':>5} {'bytes':>10} {'ratio':>7} {'ms':>9}")
+        for encoding in available_encodings():
+            for kind, levels in (("dynamic", DYNAMIC_LEVELS), ("cached", CACHED_LEVELS)):
+                level = levels[encoding]
+                runs = 5
+                started = time.perf_counter()
+                for _ in range(runs):
+                    compressed = compress(data, encoding, level)
+                elapsed_ms = (time.perf_counter() - started) * 1000 / runs
+                ratio = len(compressed) / len(data)
+                print(f"{encoding:<8} {level:>5} {len(compressed):>10} {ratio:>7.3f} {elapsed_ms:>9.2f}  ({kind})")
+        print()
@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, monitoring
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+class DatabaseSettings:
+    def __init__(self):
+        self.mongo_url = os.environ['MONGO_URL']
+        self.db_name = os.environ['DB_NAME']
+        self.max_pool_size = _env_int('MONGO_MAX_POOL_SIZE', 100)
+        self.min_pool_size = _env_int('MONGO_MIN_POOL_SIZE', 0)
+        self.max_idle_time_ms = _env_int('MONGO_MAX_IDLE_TIME_MS', None)
+        self.wait_queue_timeout_ms = _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', None)
+        self.server_selection_timeout_ms = _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000)
+        self.connect_timeout_ms = _env_int('MONGO_CONNECT_TIMEOUT_MS', 20000)
+        self.socket_timeout_ms = _env_int('MONGO_SOCKET_TIMEOUT_MS', None)
+        # Read preference applied to catalog (channel listing) reads only
+        self.catalog_read_preference = os.environ.get('MONGO_CATALOG_READ_PREFERENCE', 'primary')
+        if self.catalog_read_preference not in READ_PREFERENCES:
+            raise ValueError(f"Invalid MONGO_CATALOG_READ_PREFERENCE: {self.catalog_read_preference}")
+        # After a catalog write, catalog reads go to the primary for this long so a cache
+        # refill cannot pick up a lagging secondary's pre-write state
+        self.catalog_primary_after_write_seconds = float(os.environ.get('MONGO_CATALOG_PRIMARY_AFTER_WRITE_SECONDS', '10'))
+        write_concern = os.environ.get('MONGO_WRITE_CONCERN', '')
+        self.write_concern_w = int(write_concern) if write_concern.isdigit() else (write_concern or None)
+        self.write_concern_journal = os.environ.get('MONGO_WRITE_JOURNAL', '').lower() in ('1', 'true', 'yes') or None
+        self.write_concern_timeout_ms = _env_int('MONGO_WRITE_TIMEOUT_MS', None)
+
+    def client_kwargs(self) -> dict:
+        kwargs = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+        }
+        optional = {
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "w": self.write_concern_w,
+            "journal": self.write_concern_journal,
+            "wTimeoutMS": self.write_concern_timeout_ms,
+        }
+        kwargs.update({key: value for key, value in optional.items() if value is not None})
+        return kwargs
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks pool saturation and checkout wait times.
+
+    PyMongo emits check-out events on the thread performing the operation, so
+    the start time of a pending checkout is kept in a thread local.
+    """
+
+    def __init__(self, slow_wait_ms: float = 100.0):
+        self.slow_wait_ms = slow_wait_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open_connections = 0
+            self.checked_out = 0
+            self.peak_checked_out = 0
+            self.waiting = 0
+            self.peak_waiting = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_timeouts = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.slow_checkouts = 0
+
+    def snapshot(self, max_pool_size: Optional[int] = None) -> dict:
+        with self._lock:
+            stats = {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "waiting": self.waiting,
+                "peak_waiting": self.peak_waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "slow_checkouts": self.slow_checkouts,
+            }
+        if max_pool_size:
+            stats["max_pool_size"] = max_pool_size
+            stats["saturation"] = round(stats["checked_out"] / max_pool_size, 3)
+        return stats
+
+    def _finish_wait(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        if started is None:
+            return 0.0
+        return (time.perf_counter() - started) * 1000
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+    def connection_check_out_failed(self, event):
+        wait_ms = self._finish_wait()
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+        logger.warning("Mongo pool checkout failed (%s) after %.1f ms", event.reason, wait_ms)
+
+    def connection_checked_out(self, event):
+        wait_ms = self._finish_wait()
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            if wait_ms >= self.slow_wait_ms:
+                self.slow_checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+
+class Database:
+    """Owns the Motor client; collections are reached as attributes (``db.channels``).
+
+    The client is created by ``connect()`` from the application lifespan rather
+    than at import time, so each worker builds its own pool after forking.
+    """
+
+    def __init__(self):
+        self.settings: Optional[DatabaseSettings] = None
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.pool_monitor = PoolMonitor(float(os.environ.get('MONGO_SLOW_CHECKOUT_MS', '100')))
+        self._db = None
+        self._catalog_written_at = float("-inf")
+
+    def connect(self, settings: Optional[DatabaseSettings] = None):
+        if self.client is not None:
+            return
+        self.settings = settings or DatabaseSettings()
+        self.client = AsyncIOMotorClient(
+            self.settings.mongo_url,
+            event_listeners=[self.pool_monitor],
+            **self.settings.client_kwargs()
+        )
+        self._db = self.client[self.settings.db_name]
+        logger.info("Mongo client created: %s", self.settings.client_kwargs())
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self._db = None
+
+    def catalog(self, name: str):
+        # Catalog reads tolerate replication lag and may be routed to secondaries,
+        # except shortly after a write (see mark_catalog_write). Existence checks that
+        # must see a just-created document should use the primary collection instead.
+        read_preference = self.settings.catalog_read_preference
+        if time.monotonic() - self._catalog_written_at < self.settings.catalog_primary_after_write_seconds:
+            read_preference = "primary"
+        return self._database.get_collection(name, read_preference=READ_PREFERENCES[read_preference])
+
+    def mark_catalog_write(self):
+        """Record a catalog write (local or announced by another worker) to pin catalog reads to the primary."""
+        self._catalog_written_at = time.monotonic()
+
+    def pool_stats(self) -> dict:
+        return self.pool_monitor.snapshot(self.settings.max_pool_size if self.settings else None)
+
+    @property
+    def _database(self):
+        if self._db is None:
+            raise RuntimeError("Database is not connected")
+        return self._db
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._database[name]
@@ -0,0 +1,204 @@
+import gzip
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+from starlette.concurrency import iterate_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+EPG_BATCH_SIZE = int(os.environ.get('EPG_BATCH_SIZE', '1000'))
+# Programmes are dropped by a TTL index this long after they end
+EPG_RETENTION_HOURS = int(os.environ.get('EPG_RETENTION_HOURS', '48'))
+# How far ahead now/next looks for the following programme
+EPG_NOW_NEXT_WINDOW_HOURS = int(os.environ.get('EPG_NOW_NEXT_WINDOW_HOURS', '24'))
+
+_XMLTV_TIME = re.compile(r"^(\d{14})(?:\s*([+-]\d{4}))?")
+
+
+def normalize_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", name.lower())
+
+
+def parse_xmltv_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse an XMLTV timestamp ("20240101120000 +0100") into naive UTC."""
+    if not value:
+        return None
+    match = _XMLTV_TIME.match(value.strip())
+    if not match:
+        return None
+    parsed = datetime.strptime(match.group(1), "%Y%m%d%H%M%S")
+    offset = match.group(2)
+    if offset:
+        sign = 1 if offset[0] == "+" else -1
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+        parsed = parsed - sign * delta
+    return parsed
+
+
+def open_guide(fileobj):
+    # Accept plain or gzip-compressed XMLTV
+    head = fileobj.read(2)
+    fileobj.seek(0)
+    if head == b"\x1f\x8b":
+        return gzip.GzipFile(fileobj=fileobj)
+    return fileobj
+
+
+def iter_programme_batches(fileobj, channel_map: Dict[str, str], batch_size: int = EPG_BATCH_SIZE) -> Iterator[List[dict]]:
+    """Stream-parse an XMLTV file and yield batches of programme documents.
+
+    ``channel_map`` maps XMLTV channel ids (``epg_id``) or normalized channel
+    names to channel ids; ``<channel>`` elements are resolved through their
+    display names. Elements are cleared as soon as they are processed, so
+    memory use stays flat regardless of the guide size.
+    """
+    resolved: Dict[str, Optional[str]] = {}
+    batch: List[dict] = []
+    context = ET.iterparse(open_guide(fileobj), events=("start", "end"))
+    _, root = next(context)
+
+    for event, elem in context:
+        if event != "end":
+            continue
+
+        if elem.tag == "channel":
+            xmltv_id = elem.get("id")
+            channel_id = channel_map.get(xmltv_id)
+            if channel_id is None:
+                for display_name in elem.findall("display-name"):
+                    channel_id = channel_map.get(normalize_name(display_name.text or ""))
+                    if channel_id:
+                        break
+            resolved[xmltv_id] = channel_id
+            root.clear()
+
+        elif elem.tag == "programme":
+            xmltv_id = elem.get("channel")
+            if xmltv_id not in resolved:
+                resolved[xmltv_id] = channel_map.get(xmltv_id) or channel_map.get(normalize_name(xmltv_id or ""))
+            channel_id = resolved[xmltv_id]
+            start = parse_xmltv_time(elem.get("start"))
+            stop = parse_xmltv_time(elem.get("stop"))
+            if channel_id and start and stop:
+                batch.append({
+                    "channel_id": channel_id,
+                    "start": start,
+                    "stop": stop,
+                    "title": elem.findtext("title") or "",
+                    "description": elem.findtext("desc"),
+                    "category": elem.findtext("category"),
+                })
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            root.clear()
+
+    if batch:
+        yield batch
+
+
+async def create_epg_indexes(db):
+    await db.programmes.create_index([("channel_id", ASCENDING), ("start", ASCENDING)], unique=True)
+    await db.programmes.create_index([("channel_id", ASCENDING), ("stop", ASCENDING)])
+    await db.programmes.create_index("stop", expireAfterSeconds=EPG_RETENTION_HOURS * 3600)
+
+
+async def build_channel_map(db) -> Dict[str, str]:
+    channel_map = {}
+    async for channel in db.channels.find({"is_active": True}, {"_id": 0, "id": 1, "name": 1, "epg_id": 1}):
+        channel_map.setdefault(normalize_name(channel["name"]), channel["id"])
+        if channel.get("epg_id"):
+            channel_map[channel["epg_id"]] = channel["id"]
+    return channel_map
+
+
+async def import_xmltv(db, fileobj, progress=None) -> dict:
+    """Import an XMLTV guide; parsing runs in a worker thread, writes are batched upserts."""
+    channel_map = await build_channel_map(db)
+    stats = {"programmes": 0, "batches": 0, "channels": set()}
+    cutoff = datetime.utcnow() - timedelta(hours=EPG_RETENTION_HOURS)
+
+    async for batch in iterate_in_threadpool(iter_programme_batches(fileobj, channel_map)):
+        operations = [
+            UpdateOne(
+                {"channel_id": programme["channel_id"], "start": programme["start"]},
+                {"$set": programme},
+                upsert=True,
+            )
+            for programme in batch if programme["stop"] > cutoff
+        ]
+        if operations:
+            await db.programmes.bulk_write(operations, ordered=False)
+        stats["programmes"] += len(operations)
+        stats["batches"] += 1
+        stats["channels"].update(programme["channel_id"] for programme in batch)
+        if progress is not None:
+            await progress(stats["programmes"])
+
+    stats["channels"] = len(stats["channels"])
+    logger.info("EPG import finished: %s", stats)
+    return stats
+
+
+async def fetch_now_next(programmes, channel_ids: List[str], now: Optional[datetime] = None) -> Dict[str, dict]:
+    """Current and following programme for each channel, in one aggregation."""
+    if not channel_ids:
+        return {}
+    now = now or datetime.utcnow()
+    pipeline = [
+        {"$match": {
+            "channel_id": {"$in": channel_ids},
+            "stop": {"$gt": now, "$lte": now + timedelta(hours=EPG_NOW_NEXT_WINDOW_HOURS)},
+        }},
+        {"$sort": {"channel_id": 1, "stop": 1}},
+        {"$group": {
+            "_id": "$channel_id",
+            "programmes": {"$push": {
+                "start": "$start",
+                "stop": "$stop",
+                "title": "$title",
+                "description": "$description",
+                "category": "$category",
+            }},
+        }},
+        {"$project": {"programmes": {"$slice": ["$programmes", 2]}}},
+    ]
+
+    result = {}
+    async for row in programmes.aggregate(pipeline):
+        items = row["programmes"]
+        current = items[0] if items and items[0]["start"] <= now else None
+        upcoming = items[1:] if current else items
+        result[row["_id"]] = {
+            "now": current,
+            "next": upcoming[0] if upcoming else None,
+        }
+    return result
+
+
+if __name__ == "__main__":
+    # Offline import: python epg.py guide.xml[.gz]
+    import asyncio
+    import sys
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+
+    async def main(path):
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        database = client[os.environ['DB_NAME']]
+        await create_epg_indexes(database)
+        with open(path, "rb") as handle:
+            print(await import_xmltv(database, handle))
+        client.close()
+
+    asyncio.run(main(sys.argv[1]))
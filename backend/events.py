@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+RESYNC_TOPIC = "bus.resync"
+
+# "local" (single worker), "mongo" (change stream, needs a replica set) or "socket"
+EVENT_BUS = os.environ.get('EVENT_BUS', 'local')
+EVENT_BUS_HOST = os.environ.get('EVENT_BUS_HOST', '127.0.0.1')
+EVENT_BUS_PORT = int(os.environ.get('EVENT_BUS_PORT', '8765'))
+EVENT_BUS_RECONNECT_SECONDS = float(os.environ.get('EVENT_BUS_RECONNECT_SECONDS', '1'))
+# The broker disconnects a worker whose unsent events exceed this (it resyncs on reconnect)
+EVENT_BUS_PEER_BUFFER_BYTES = int(os.environ.get('EVENT_BUS_PEER_BUFFER_BYTES', str(1024 * 1024)))
+
+
+class LocalEventBus:
+    """Dispatches events to subscribers in this process only.
+
+    Remote buses subclass this: ``publish`` always delivers locally first and
+    then forwards the event; events coming back from other processes arrive
+    through ``_receive``, which drops our own echoes by origin. Each time a
+    remote bus (re)connects it emits a local ``RESYNC_TOPIC`` event, since
+    anything published while disconnected was missed.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._subscribers: Dict[str, List[Callable]] = defaultdict(list)
+
+    def subscribe(self, topic: str, handler: Callable[[dict], None]):
+        self._subscribers[topic].append(handler)
+
+    async def create_indexes(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, topic: str, payload: dict):
+        event = {"topic": topic, "payload": payload, "origin": self.origin}
+        self._dispatch(event)
+        # Callers publish after a committed write; a bus outage must not fail the request.
+        # Other workers catch up through their cache TTLs and the resync on reconnect.
+        try:
+            await self._forward(event)
+        except Exception as exc:
+            logger.warning("Failed to forward %s event: %s", topic, exc)
+
+    async def _forward(self, event: dict):
+        pass
+
+    def _dispatch(self, event: dict):
+        for handler in self._subscribers.get(event["topic"], []):
+            try:
+                handler(event["payload"])
+            except Exception as exc:
+                logger.warning("Event handler for %s failed: %s", event["topic"], exc)
+
+    def _resync(self):
+        self._dispatch({"topic": RESYNC_TOPIC, "payload": {}, "origin": self.origin})
+
+    def _receive(self, event: dict):
+        if event.get("origin") != self.origin:
+            self._dispatch(event)
+
+
+class MongoEventBus(LocalEventBus):
+    """Broadcasts through inserts into the ``events`` collection, watched with a change stream."""
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+        self._task = None
+
+    async def create_indexes(self):
+        # Events are only needed while in flight; old ones expire
+        await self.db.events.create_index("created_at", expireAfterSeconds=3600)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _forward(self, event: dict):
+        await self.db.events.insert_one({**event, "created_at": datetime.utcnow()})
+
+    async def _watch(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.db.events.watch(pipeline) as stream:
+                    self._resync()
+                    async for change in stream:
+                        self._receive(change["fullDocument"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Event change stream interrupted: %s", exc)
+                await asyncio.sleep(EVENT_BUS_RECONNECT_SECONDS)
+
+
+class SocketEventBus(LocalEventBus):
+    """Newline-delimited JSON over TCP through a broker hosted by one of the workers.
+
+    Every worker tries to bind the broker address; the one that succeeds fans
+    events out to all connected workers, and the rest connect as clients. If
+    the broker's worker exits, the others race to take over.
+    """
+
+    def __init__(self, host: str = EVENT_BUS_HOST, port: int = EVENT_BUS_PORT):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self._server = None
+        self._peers: List[asyncio.StreamWriter] = []
+        self._writer = None
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            self._server.close()
+            for peer in self._peers:
+                peer.close()
+
+    async def _forward(self, event: dict):
+        if self._writer is None:
+            logger.warning("Event bus not connected, %s event delivered locally only", event["topic"])
+            return
+        self._writer.write(json.dumps(event).encode("utf-8") + b"\n")
+        await self._writer.drain()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._become_broker()
+            except OSError:
+                pass  # another worker already hosts the broker
+
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                self._resync()
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self._receive(json.loads(line))
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ValueError) as exc:
+                logger.warning("Event bus connection lost: %s", exc)
+            self._writer = None
+            await asyncio.sleep(EVENT_BUS_RECONNECT_SECONDS)
+
+    async def _become_broker(self):
+        if self._server is not None:
+            return
+        self._server = await asyncio.start_server(self._serve_peer, self.host, self.port)
+        logger.info("Event bus broker listening on %s:%d", self.host, self.port)
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.append(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(self._peers):
+                    try:
+                        peer.write(line)
+                    except (OSError, RuntimeError):
+                        pass
+                    # Not drained per peer, so one stalled worker cannot hold up the rest
+                    if peer.transport.get_write_buffer_size() > EVENT_BUS_PEER_BUFFER_BYTES:
+                        logger.warning("Event bus peer is not reading, disconnecting it")
+                        self._drop_peer(peer)
+        except OSError:
+            pass  # connection reset, e.g. after we dropped this peer
+        finally:
+            self._drop_peer(writer)
+
+    def _drop_peer(self, writer: asyncio.StreamWriter):
+        if writer in self._peers:
+            self._peers.remove(writer)
+        writer.transport.abort()
+
+
+def build_event_bus(db):
+    if EVENT_BUS == "local":
+        return LocalEventBus()
+    if EVENT_BUS == "mongo":
+        return MongoEventBus(db)
+    if EVENT_BUS == "socket":
+        return SocketEventBus()
+    raise ValueError(f"Unknown EVENT_BUS: {EVENT_BUS}")
@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', '2'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', '5'))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1'))
+# A running job whose lease expires (worker died) is picked up again by the mongo store
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '300'))
+# "memory" (default) or "mongo" for a durable queue shared by all workers
+JOB_STORE = os.environ.get('JOB_STORE', 'memory')
+# Finished jobs are kept this long (TTL index in mongo); memory also keeps at most JOB_HISTORY_LIMIT
+JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', '168'))
+JOB_HISTORY_LIMIT = int(os.environ.get('JOB_HISTORY_LIMIT', '1000'))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def new_job(job_type: str, params: dict, max_attempts: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "type": job_type,
+        "params": params,
+        "status": QUEUED,
+        "progress": None,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "error": None,
+        "result": None,
+        "run_at": now,
+        "lease_until": None,
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+
+
+class LeaseLost(Exception):
+    """The job was re-claimed by another worker after this worker's lease expired."""
+
+
+def _claimable(job: dict, now: datetime) -> bool:
+    # Memory jobs die with their process, so an expired lease here only means a slow
+    # handler that is still running; only the mongo store re-claims those
+    return job["status"] == QUEUED and job["run_at"] <= now
+
+
+def _claim_update(job: dict, now: datetime) -> dict:
+    return {
+        "status": RUNNING,
+        "attempts": job["attempts"] + 1,
+        "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS),
+        "started_at": now,
+    }
+
+
+class MemoryJobStore:
+    """Jobs kept in this process; lost on restart."""
+
+    def __init__(self, history_limit: int = JOB_HISTORY_LIMIT):
+        self.history_limit = history_limit
+        self._jobs: Dict[str, dict] = {}
+
+    async def create_indexes(self):
+        pass
+
+    async def insert(self, job: dict):
+        self._jobs[job["id"]] = dict(job)
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        candidates = [job for job in self._jobs.values() if _claimable(job, now)]
+        if not candidates:
+            return None
+        job = min(candidates, key=lambda item: item["run_at"])
+        job.update(_claim_update(job, now))
+        return dict(job)
+
+    async def update(self, job_id: str, fields: dict, attempts: Optional[int] = None) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or (attempts is not None and job["attempts"] != attempts):
+            return False
+        job.update(fields)
+        if fields.get("status") in (SUCCEEDED, FAILED):
+            self._prune()
+        return True
+
+    def _prune(self):
+        # Drop finished jobs past the retention period, then the oldest beyond the limit
+        cutoff = datetime.utcnow() - timedelta(hours=JOB_RETENTION_HOURS)
+        finished = sorted(
+            (job for job in self._jobs.values() if job["status"] in (SUCCEEDED, FAILED)),
+            key=lambda item: item["finished_at"],
+        )
+        excess = len(finished) - self.history_limit
+        for index, job in enumerate(finished):
+            if index < excess or job["finished_at"] < cutoff:
+                del self._jobs[job["id"]]
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def list(self, status: Optional[str] = None, limit: int = 100) -> List[dict]:
+        jobs = [job for job in self._jobs.values() if status is None or job["status"] == status]
+        jobs.sort(key=lambda item: item["created_at"], reverse=True)
+        return [dict(job) for job in jobs[:limit]]
+
+
+class MongoJobStore:
+    """Durable queue in the ``jobs`` collection, shared by every worker process."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def create_indexes(self):
+        # Called from the app's warm-up; claims work (unindexed) before it finishes
+        await self.db.jobs.create_index("id", unique=True)
+        await self.db.jobs.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+        await self.db.jobs.create_index([("created_at", DESCENDING)])
+        # Only finished jobs have a date in finished_at, so queued and running ones never expire
+        await self.db.jobs.create_index("finished_at", expireAfterSeconds=JOB_RETENTION_HOURS * 3600)
+
+    async def insert(self, job: dict):
+        await self.db.jobs.insert_one(dict(job))
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        # The update pipeline increments attempts atomically with the claim
+        return await self.db.jobs.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED, "run_at": {"$lte": now}},
+                {"status": RUNNING, "lease_until": {"$lte": now}},
+            ]},
+            [{"$set": {
+                "status": RUNNING,
+                "attempts": {"$add": ["$attempts", 1]},
+                "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "started_at": now,
+            }}],
+            sort=[("run_at", ASCENDING)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def update(self, job_id: str, fields: dict, attempts: Optional[int] = None) -> bool:
+        # ``attempts`` fences the write: once another worker re-claims an expired
+        # lease it has incremented attempts, and the stale worker's updates no longer match
+        query = {"id": job_id}
+        if attempts is not None:
+            query["attempts"] = attempts
+        result = await self.db.jobs.update_one(query, {"$set": fields})
+        return result.matched_count > 0
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.db.jobs.find_one({"id": job_id}, {"_id": 0})
+
+    async def list(self, status: Optional[str] = None, limit: int = 100) -> List[dict]:
+        query = {"status": status} if status else {}
+        return await self.db.jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
+
+
+class JobContext:
+    def __init__(self, manager: "JobManager", job: dict):
+        self.manager = manager
+        self.job = job
+
+    @property
+    def params(self) -> dict:
+        return self.job["params"]
+
+    @property
+    def is_last_attempt(self) -> bool:
+        return self.job["attempts"] >= self.job["max_attempts"]
+
+    async def progress(self, value):
+        # Also renews the lease so long jobs are not picked up twice
+        renewed = await self.manager.store.update(self.job["id"], {
+            "progress": value,
+            "lease_until": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS),
+        }, attempts=self.job["attempts"])
+        if not renewed:
+            raise LeaseLost(self.job["id"])
+
+
+class JobManager:
+    """Runs registered job handlers on a bounded set of asyncio workers.
+
+    Failed jobs are retried with exponential backoff up to ``max_attempts``.
+    """
+
+    def __init__(self, store, concurrency: int = JOB_CONCURRENCY):
+        self.store = store
+        self.concurrency = concurrency
+        self.handlers: Dict[str, Callable[[JobContext], Awaitable]] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def handler(self, job_type: str):
+        def register(func):
+            self.handlers[job_type] = func
+            return func
+        return register
+
+    async def submit(self, job_type: str, params: Optional[dict] = None, max_attempts: int = JOB_MAX_ATTEMPTS) -> dict:
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = new_job(job_type, params or {}, max_attempts)
+        await self.store.insert(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(index)) for index in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job = await self.store.claim()
+            except Exception as exc:
+                logger.warning("Job worker %d failed to claim: %s", index, exc)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # e.g. the store was unreachable while recording the outcome; the
+                # lease expires and the job is picked up again
+                logger.exception("Job worker %d failed to run job %s: %s", index, job["id"], exc)
+
+    async def _run(self, job: dict):
+        handler = self.handlers.get(job["type"])
+        attempts = job["attempts"]
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type {job['type']}")
+            result = await handler(JobContext(self, job))
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back to the queue
+            await self.store.update(job["id"], {"status": QUEUED, "lease_until": None, "attempts": attempts - 1}, attempts=attempts)
+            raise
+        except LeaseLost:
+            logger.warning("Job %s (%s) lost its lease to another worker, abandoning", job["id"], job["type"])
+            return
+        except Exception as exc:
+            now = datetime.utcnow()
+            if job["attempts"] < job["max_attempts"]:
+                delay = JOB_RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1))
+                logger.warning("Job %s (%s) failed, retrying in %.0fs: %s", job["id"], job["type"], delay, exc)
+                await self.store.update(job["id"], {
+                    "status": QUEUED,
+                    "error": str(exc),
+                    "lease_until": None,
+                    "run_at": now + timedelta(seconds=delay),
+                }, attempts=attempts)
+            else:
+                logger.error("Job %s (%s) failed: %s", job["id"], job["type"], exc)
+                await self.store.update(job["id"], {
+                    "status": FAILED,
+                    "error": str(exc),
+                    "lease_until": None,
+                    "finished_at": now,
+                }, attempts=attempts)
+            return
+
+        if not await self.store.update(job["id"], {
+            "status": SUCCEEDED,
+            "result": result,
+            "error": None,
+            "lease_until": None,
+            "finished_at": datetime.utcnow(),
+        }, attempts=attempts):
+            logger.warning("Job %s (%s) finished after losing its lease, result discarded", job["id"], job["type"])
+
+
+def build_job_store(db):
+    if JOB_STORE == "mongo":
+        return MongoJobStore(db)
+    if JOB_STORE == "memory":
+        return MemoryJobStore()
+    raise ValueError(f"Unknown JOB_STORE: {JOB_STORE}")
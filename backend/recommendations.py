@@ -0,0 +1,190 @@
+import heapq
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import ReplaceOne
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', '20'))
+# Seconds between scheduled rebuilds; 0 disables the schedule
+RECOMMENDATIONS_REFRESH_SECONDS = int(os.environ.get('RECOMMENDATIONS_REFRESH_SECONDS', '0'))
+CATEGORY_WEIGHT = float(os.environ.get('RECOMMENDATIONS_CATEGORY_WEIGHT', '0.3'))
+TEXT_WEIGHT = float(os.environ.get('RECOMMENDATIONS_TEXT_WEIGHT', '0.4'))
+COWATCH_WEIGHT = float(os.environ.get('RECOMMENDATIONS_COWATCH_WEIGHT', '0.3'))
+# Tokens shared by more channels than this carry no signal and are skipped
+MAX_TOKEN_POSTINGS = 500
+# Categories larger than this only contribute a window of members as candidates
+MAX_CATEGORY_CANDIDATES = 500
+
+_TOKEN = re.compile(r"[a-z0-9]{2,}")
+_STOPWORDS = {"the", "and", "for", "with", "from", "live", "channel", "tv", "24", "hd"}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def text_vectors(channels: List[dict]) -> Dict[str, Dict[str, float]]:
+    """L2-normalized TF-IDF vectors of channel name and description."""
+    documents = {
+        channel["id"]: Counter(tokenize(f"{channel['name']} {channel.get('description') or ''}"))
+        for channel in channels
+    }
+    document_frequency = Counter(token for terms in documents.values() for token in terms)
+    total = len(documents)
+
+    vectors = {}
+    for channel_id, terms in documents.items():
+        vector = {
+            token: count * math.log((1 + total) / (1 + document_frequency[token]))
+            for token, count in terms.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors[channel_id] = {token: weight / norm for token, weight in vector.items()}
+    return vectors
+
+
+def cowatch_scores(histories: Iterable[List[str]]) -> Dict[str, Dict[str, float]]:
+    """Cosine similarity of channels over the sets of users who watched or saved them."""
+    pair_counts: Dict[str, Counter] = defaultdict(Counter)
+    viewers = Counter()
+    for history in histories:
+        watched = sorted(set(history))
+        viewers.update(watched)
+        for index, first in enumerate(watched):
+            for second in watched[index + 1:]:
+                pair_counts[first][second] += 1
+                pair_counts[second][first] += 1
+
+    return {
+        channel_id: {
+            other: count / math.sqrt(viewers[channel_id] * viewers[other])
+            for other, count in counts.items()
+        }
+        for channel_id, counts in pair_counts.items()
+    }
+
+
+def build_similarity(channels: List[dict], histories: Iterable[List[str]], top_k: int = RECOMMENDATIONS_TOP_K) -> Dict[str, List[Tuple[str, float]]]:
+    """Top-K most similar channels for every channel.
+
+    Candidates come from an inverted index (shared tokens, same category,
+    co-watch), so channels with nothing in common are never compared. Very
+    common tokens are skipped and large categories contribute only a window
+    of ``top_k`` members, keeping each channel's candidate set bounded.
+    """
+    vectors = text_vectors(channels)
+    cowatch = cowatch_scores(histories)
+    categories = {channel["id"]: channel.get("category") for channel in channels}
+
+    postings: Dict[str, List[str]] = defaultdict(list)
+    for channel_id, vector in vectors.items():
+        for token in vector:
+            postings[token].append(channel_id)
+    by_category: Dict[str, List[str]] = defaultdict(list)
+    category_position: Dict[str, int] = {}
+    for channel_id, category in categories.items():
+        if category:
+            category_position[channel_id] = len(by_category[category])
+            by_category[category].append(channel_id)
+
+    neighbours = {}
+    for channel_id, vector in vectors.items():
+        candidates = set(cowatch.get(channel_id, {}))
+        for token in vector:
+            if len(postings[token]) <= MAX_TOKEN_POSTINGS:
+                candidates.update(postings[token])
+        if categories[channel_id]:
+            members = by_category[categories[channel_id]]
+            if len(members) <= MAX_CATEGORY_CANDIDATES:
+                candidates.update(members)
+            else:
+                # Members sharing no token or viewer all score just the category
+                # weight, so the next top_k members (wrapping) serve as well as any
+                position = category_position[channel_id]
+                candidates.update(members[(position + offset) % len(members)] for offset in range(1, top_k + 1))
+        candidates.discard(channel_id)
+
+        scored = []
+        for other in candidates:
+            if other not in vectors:
+                continue  # co-watched channel that is no longer active
+            other_vector = vectors[other]
+            text = sum(weight * other_vector.get(token, 0.0) for token, weight in vector.items())
+            same_category = 1.0 if categories[channel_id] and categories[channel_id] == categories[other] else 0.0
+            score = (
+                CATEGORY_WEIGHT * same_category
+                + TEXT_WEIGHT * text
+                + COWATCH_WEIGHT * cowatch.get(channel_id, {}).get(other, 0.0)
+            )
+            if score > 0:
+                scored.append((score, other))
+        neighbours[channel_id] = [(other, round(score, 4)) for score, other in heapq.nlargest(top_k, scored)]
+    return neighbours
+
+
+async def create_recommendation_indexes(db):
+    await db.channel_similar.create_index("channel_id", unique=True)
+
+
+async def rebuild_recommendations(db, progress=None) -> dict:
+    channels = await db.channels.find(
+        {"is_active": True},
+        {"_id": 0, "id": 1, "name": 1, "description": 1, "category": 1}
+    ).to_list(None)
+
+    histories = []
+    async for library in db.user_library.find({}, {"_id": 0, "favorites": 1, "recent.channel_id": 1}):
+        history = list(library.get("favorites", []))
+        history.extend(item["channel_id"] for item in library.get("recent", []))
+        histories.append(history)
+
+    if progress is not None:
+        await progress({"stage": "scoring", "channels": len(channels), "users": len(histories)})
+    # CPU-bound; scoring a large catalog would otherwise stall the event loop
+    neighbours = await run_in_threadpool(build_similarity, channels, histories)
+
+    built_at = datetime.utcnow()
+    operations = [
+        ReplaceOne(
+            {"channel_id": channel_id},
+            {
+                "channel_id": channel_id,
+                "neighbours": [other for other, _ in similar],
+                "scores": [score for _, score in similar],
+                "built_at": built_at,
+            },
+            upsert=True,
+        )
+        for channel_id, similar in neighbours.items()
+    ]
+    for start in range(0, len(operations), 1000):
+        await db.channel_similar.bulk_write(operations[start:start + 1000], ordered=False)
+    # Drop entries for channels that are gone
+    await db.channel_similar.delete_many({"built_at": {"$lt": built_at}})
+
+    stats = {"channels": len(channels), "users": len(histories)}
+    logger.info("Recommendations rebuilt: %s", stats)
+    return stats
+
+
+def rank_for_user(similar_docs: List[dict], seeds: List[str], exclude: Iterable[str], limit: int) -> List[str]:
+    """Merge the neighbour lists of a user's channels, weighting recent seeds higher."""
+    seed_weight = {channel_id: 1.0 / (1 + index) for index, channel_id in enumerate(seeds)}
+    excluded = set(exclude)
+    totals = Counter()
+    for doc in similar_docs:
+        weight = seed_weight.get(doc["channel_id"], 0.0)
+        if not weight:
+            continue
+        for other, score in zip(doc["neighbours"], doc["scores"]):
+            if other not in excluded:
+                totals[other] += weight * score
+    return [channel_id for channel_id, _ in totals.most_common(limit)]
@@ -1,39 +1,138 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from startup import startup_profiler  # first: loads .env and times every import below
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
-from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, List, Optional, Union
 import uuid
 from datetime import datetime, timedelta
 import jwt
-from passlib.context import CryptContext
 import base64
-from urllib.parse import urlparse
+from urllib.parse import unquote_to_bytes, urlparse
 import re
+import asyncio
+import shutil
+import socket
+import tempfile
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from starlette.concurrency import run_in_threadpool
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+from compression import CompressionMiddleware, CompressedResponseCache, negotiate_encoding
+from database import Database
+from events import RESYNC_TOPIC, build_event_bus
+from epg import create_epg_indexes, fetch_now_next, import_xmltv
+from stream_urls import (
+    StreamUrlConflict, channels_using, claim_urls, create_stream_url_indexes, dedupe_urls,
+    normalize_stream_url, rebuild_stream_url_index, release_urls
+)
+from jobs import QUEUED, RUNNING, JobManager, LeaseLost, build_job_store
+from recommendations import (
+    RECOMMENDATIONS_REFRESH_SECONDS, create_recommendation_indexes, rank_for_user, rebuild_recommendations
+)
+from tracing import TRACING_ENABLED, TRACING_EXPORTER, TracingMiddleware, build_exporter, span
+
+startup_profiler.imports_done()
+
+# MongoDB connection (the client is created in the lifespan handler)
+db = Database()
+
+# Background jobs (JOB_STORE=memory|mongo, JOB_CONCURRENCY workers); built here so handlers
+# can register, but no workers, connections or indexes exist until the lifespan/warm-up
+jobs = JobManager(build_job_store(db))
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Opt-in request tracing (TRACING_ENABLED / TRACING_EXPORTER); the exporter thread starts on first export
+trace_exporter = build_exporter(TRACING_EXPORTER) if TRACING_ENABLED else None
 
 # Security
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # Built on first use (or during warm-up) rather than at import time
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Per-user library limits (favorites and recent-watch arrays are capped)
+MAX_FAVORITES = int(os.environ.get('MAX_FAVORITES', '200'))
+MAX_RECENT = int(os.environ.get('MAX_RECENT', '50'))
+
+# Serialized catalog listings, with their compressed variants built on first use
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '30'))
+catalog_cache = CompressedResponseCache(ttl=CATALOG_CACHE_TTL)
+
+# Change events keep every worker's in-process caches coherent (EVENT_BUS=local|mongo|socket);
+# the bus only connects in event_bus.start() from the lifespan
+event_bus = build_event_bus(db)
+
+def invalidate_catalog(event: dict):
+    # Refills right after a write read from the primary, not from a lagging secondary
+    db.mark_catalog_write()
+    catalog_cache.clear()
+
+event_bus.subscribe("channels", invalidate_catalog)
+event_bus.subscribe(RESYNC_TOPIC, invalidate_catalog)
+
+async def warm_up():
+    # Runs after the worker starts serving; /api/ready flips once it completes
+    delay = 1
+    while True:
+        try:
+            with startup_profiler.step("db.ping"):
+                await db.client.admin.command("ping")
+            with startup_profiler.step("db.indexes"):
+                await create_indexes()
+            with startup_profiler.step("stream_url_index"):
+                await ensure_stream_url_index()
+            with startup_profiler.step("db.pool"):
+                await asyncio.gather(*(
+                    db.client.admin.command("ping") for _ in range(max(db.settings.min_pool_size, 1))
+                ))
+            with startup_profiler.step("crypt_context"):
+                await run_in_threadpool(lambda: get_pwd_context().handler("bcrypt").get_backend())
+            with startup_profiler.step("catalog_cache"):
+                for view in ("full", "summary"):
+                    await load_channel_listing(None, None, view, None)
+            startup_profiler.mark_ready()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            startup_profiler.error = str(exc)
+            logger.warning("Warm-up failed, retrying in %ds: %s", delay, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_profiler.step("db.connect"):
+        db.connect()
+    with startup_profiler.step("event_bus.start"):
+        await event_bus.start()
+    with startup_profiler.step("jobs.start"):
+        await jobs.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    scheduler = asyncio.create_task(schedule_recommendations()) if RECOMMENDATIONS_REFRESH_SECONDS else None
+    yield
+    warm_up_task.cancel()
+    if scheduler is not None:
+        scheduler.cancel()
+    await jobs.stop()
+    await event_bus.stop()
+    db.close()
+    if trace_exporter is not None:
+        trace_exporter.shutdown()
+
 # Create the main app without a prefix
-app = FastAPI(title="Live Streaming Platform", version="1.0.0")
+app = FastAPI(title="Live Streaming Platform", version="1.0.0", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -76,6 +175,7 @@ class Channel(BaseModel):
     logo: Optional[str] = None  # Base64 encoded image
     urls: List[str] = []  # Multiple streaming URLs
     category: Optional[str] = None
+    epg_id: Optional[str] = None  # XMLTV channel id used by the EPG importer
     is_active: bool = True
     created_by: str  # User ID
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -87,6 +187,7 @@ class ChannelCreate(BaseModel):
     logo: Optional[str] = None
     urls: List[str] = []
     category: Optional[str] = None
+    epg_id: Optional[str] = None
 
 class ChannelResponse(BaseModel):
     id: str
@@ -95,17 +196,87 @@ class ChannelResponse(BaseModel):
     logo: Optional[str]
     urls: List[str]
     category: Optional[str]
+    epg_id: Optional[str] = None
     is_active: bool
     created_by: str
     created_at: datetime
     updated_at: datetime
 
+class ChannelSummary(BaseModel):
+    # Grid card: inline (data:) logos are referenced by URL rather than embedded
+    id: str
+    name: str
+    category: Optional[str]
+    logo_url: Optional[str] = None
+
+class ChannelPartial(BaseModel):
+    # Shape of a channel returned with an explicit ?fields= projection
+    id: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+    logo: Optional[str] = None
+    urls: Optional[List[str]] = None
+    category: Optional[str] = None
+    epg_id: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_by: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+CHANNEL_FIELDS = (
+    "id", "name", "description", "logo", "urls", "category", "epg_id",
+    "is_active", "created_by", "created_at", "updated_at",
+)
+CHANNEL_SUMMARY_FIELDS = ("id", "name", "category", "logo", "updated_at")
+
+class RecentChannel(ChannelSummary):
+    watched_at: datetime
+
+class UserLibraryResponse(BaseModel):
+    favorites: List[ChannelSummary]
+    recent: List[RecentChannel]
+
+class ProgrammeResponse(BaseModel):
+    start: datetime
+    stop: datetime
+    title: str
+    description: Optional[str] = None
+    category: Optional[str] = None
+
+class JobResponse(BaseModel):
+    id: str
+    type: str
+    status: str
+    progress: Optional[Any] = None
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class NowNextResponse(BaseModel):
+    channel_id: str
+    now: Optional[ProgrammeResponse] = None
+    next: Optional[ProgrammeResponse] = None
+
 # Helper functions
+async def create_indexes():
+    await db.channels.create_index("id", unique=True)
+    await db.user_library.create_index("user_id", unique=True)
+    await create_epg_indexes(db)
+    await create_recommendation_indexes(db)
+    await create_stream_url_indexes(db)
+    # Job queue and event bus indexes (no-ops for the in-process implementations)
+    await jobs.store.create_indexes()
+    await event_bus.create_indexes()
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -134,7 +305,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = await db.users.find_one({"username": username})
+    with span("mongo.users.find_one"):
+        user = await db.users.find_one({"username": username})
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -154,6 +326,7 @@ async def get_current_super_user(current_user: User = Depends(get_current_user))
 def validate_url(url: str) -> bool:
     try:
         result = urlparse(url)
+        result.port  # raises for a malformed or out-of-range port
         return all([result.scheme, result.netloc])
     except ValueError:
         return False
@@ -161,6 +334,150 @@ def validate_url(url: str) -> bool:
 def validate_m3u8_url(url: str) -> bool:
     return validate_url(url) and url.lower().endswith('.m3u8')
 
+def logo_url(channel: dict) -> Optional[str]:
+    logo = channel.get("logo")
+    if not logo or not logo.startswith("data:"):
+        return logo
+    # Versioned by updated_at so clients can cache the image indefinitely
+    version = int(channel["updated_at"].timestamp()) if channel.get("updated_at") else 0
+    return f"/api/channels/{channel['id']}/logo?v={version}"
+
+def channel_summary(channel: dict) -> ChannelSummary:
+    return ChannelSummary(
+        id=channel["id"],
+        name=channel["name"],
+        category=channel.get("category"),
+        logo_url=logo_url(channel),
+    )
+
+def build_projection(fields) -> dict:
+    # Only the listed columns are read from Mongo; "id" is always included
+    projection = {"_id": 0, "id": 1}
+    for field in fields:
+        projection[field] = 1
+    return projection
+
+def parse_fields(fields: str) -> List[str]:
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in CHANNEL_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown channel fields: {', '.join(unknown)}"
+        )
+    return requested
+
+async def fetch_channel_summaries(channel_ids: List[str]) -> dict:
+    # One batched $in lookup for every channel a personalized view references
+    if not channel_ids:
+        return {}
+    with span("mongo.channels.find_in", ids=len(channel_ids)):
+        channels = await db.catalog("channels").find(
+            {"id": {"$in": list(set(channel_ids))}, "is_active": True},
+            build_projection(CHANNEL_SUMMARY_FIELDS),
+        ).to_list(None)
+    return {channel["id"]: channel_summary(channel) for channel in channels}
+
+def move_to_front(array_field: str, entry, channel_id: str, item_path: str, limit: int) -> list:
+    # Update pipeline: drop the channel's existing entry, prepend the new one, cap the array
+    return [{"$set": {array_field: {"$slice": [
+        {"$concatArrays": [
+            [{"$literal": entry}],
+            {"$filter": {
+                "input": {"$ifNull": [f"${array_field}", []]},
+                "as": "item",
+                "cond": {"$ne": [item_path, {"$literal": channel_id}]},
+            }},
+        ]},
+        limit,
+    ]}}}]
+
+async def get_active_channel_or_404(channel_id: str) -> dict:
+    # Primary read: the channel may have been created moments ago
+    with span("mongo.channels.exists"):
+        channel = await db.channels.find_one({"id": channel_id, "is_active": True}, {"_id": 0, "id": 1})
+    if not channel:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Channel not found"
+        )
+    return channel
+
+async def claim_channel_urls(channel_id: str, urls: List[str]):
+    try:
+        with span("mongo.stream_urls.claim", urls=len(urls)):
+            await claim_urls(db, channel_id, urls)
+    except StreamUrlConflict as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Stream URL already used by another channel: {exc.url}"
+        )
+
+async def load_channel_listing(category, search, view: str, requested_fields):
+    # Serialized listing from the catalog cache, loading it from Mongo on a miss
+    cache_key = ("channels", category, search, view, tuple(requested_fields or ()))
+    with span("catalog_cache.get") as cache_span:
+        entry = catalog_cache.get(cache_key)
+        if cache_span:
+            cache_span.set("hit", entry is not None)
+    if entry is not None:
+        return entry
+    # An invalidation during the query means the rows may predate the write
+    generation = catalog_cache.generation
+    
+    query = {"is_active": True}
+    
+    if category:
+        query["category"] = category
+    
+    if search:
+        query["$or"] = [
+            {"name": {"$regex": search, "$options": "i"}},
+            {"description": {"$regex": search, "$options": "i"}}
+        ]
+    
+    if requested_fields:
+        projection = build_projection(requested_fields)
+    elif view == "summary":
+        projection = build_projection(CHANNEL_SUMMARY_FIELDS)
+    else:
+        projection = {"_id": 0}
+    
+    # find() only builds a lazy cursor; the query and transfer both happen in to_list
+    with span("mongo.channels.find", view=view) as find_span:
+        channels = await db.catalog("channels").find(query, projection).sort("created_at", -1).to_list(1000)
+        if find_span:
+            find_span.set("rows", len(channels))
+    
+    with span("build_models"):
+        if requested_fields:
+            models = [ChannelPartial(**channel) for channel in channels]
+        elif view == "summary":
+            models = [channel_summary(channel) for channel in channels]
+        else:
+            models = [ChannelResponse(**channel) for channel in channels]
+    
+    with span("serialize") as serialize_span:
+        # Only a fields= projection omits what was not requested; full and summary
+        # rows keep every field, with defaults for documents that predate it
+        body = JSONResponse(content=jsonable_encoder(models, exclude_unset=bool(requested_fields))).body
+        if serialize_span:
+            serialize_span.set("bytes", len(body))
+    return catalog_cache.set(cache_key, body, generation)
+
+async def cached_response(request: Request, entry) -> Response:
+    with span("compress") as compress_span:
+        body, encoding = await entry.encoded(
+            negotiate_encoding(request.headers.get("accept-encoding")),
+            catalog_cache.minimum_size,
+        )
+        if compress_span:
+            compress_span.set("encoding", encoding or "identity")
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Authentication Routes
 @api_router.post("/auth/register", response_model=UserResponse)
 async def register(user_data: UserCreate):
@@ -181,7 +498,8 @@ async def register(user_data: UserCreate):
         is_super_user=False
     )
     
-    await db.users.insert_one(user.dict())
+    with span("mongo.users.insert_one"):
+        await db.users.insert_one(user.dict())
     return UserResponse(**user.dict())
 
 @api_router.post("/auth/login", response_model=Token)
@@ -224,33 +542,75 @@ async def create_channel(channel_data: ChannelCreate, current_user: User = Depen
         name=channel_data.name,
         description=channel_data.description,
         logo=channel_data.logo,
-        urls=channel_data.urls,
+        urls=dedupe_urls(channel_data.urls),
         category=channel_data.category,
+        epg_id=channel_data.epg_id,
         created_by=current_user.id
     )
     
-    await db.channels.insert_one(channel.dict())
+    await claim_channel_urls(channel.id, channel.urls)
+    try:
+        with span("mongo.channels.insert_one"):
+            await db.channels.insert_one(channel.dict())
+    except Exception:
+        await release_urls(db, channel.id, channel.urls)
+        raise
+    with span("event_bus.publish"):
+        await event_bus.publish("channels", {"action": "created", "channel_id": channel.id})
     return ChannelResponse(**channel.dict())
 
-@api_router.get("/channels", response_model=List[ChannelResponse])
-async def get_channels(category: Optional[str] = None, search: Optional[str] = None):
-    query = {"is_active": True}
-    
-    if category:
-        query["category"] = category
-    
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-    
-    channels = await db.channels.find(query).sort("created_at", -1).to_list(1000)
-    return [ChannelResponse(**channel) for channel in channels]
+@api_router.get(
+    "/channels",
+    response_model=List[Union[ChannelResponse, ChannelSummary, ChannelPartial]],
+    response_model_exclude_unset=True,
+)
+async def get_channels(
+    request: Request,
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    view: str = "full",
+    fields: Optional[str] = None,
+):
+    if view not in ("full", "summary"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="view must be 'full' or 'summary'"
+        )
+
+    requested_fields = parse_fields(fields) if fields else None
+    entry = await load_channel_listing(category, search, view, requested_fields)
+    return await cached_response(request, entry)
+
+@api_router.get("/channels/{channel_id}/logo")
+async def get_channel_logo(channel_id: str):
+    # Serves inline data: logos as images so summary views only carry a URL
+    with span("mongo.channels.find_one"):
+        channel = await db.catalog("channels").find_one(
+            {"id": channel_id, "is_active": True}, {"_id": 0, "logo": 1}
+        )
+    logo = (channel or {}).get("logo")
+    if not logo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Logo not found"
+        )
+    if not logo.startswith("data:"):
+        return RedirectResponse(logo)
+    header, _, data = logo.partition(",")
+    media_type = header[len("data:"):].split(";")[0] or "application/octet-stream"
+    try:
+        content = base64.b64decode(data) if header.endswith(";base64") else unquote_to_bytes(data)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Logo not found"
+        )
+    return Response(content=content, media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
 @api_router.get("/channels/{channel_id}", response_model=ChannelResponse)
 async def get_channel(channel_id: str):
-    channel = await db.channels.find_one({"id": channel_id, "is_active": True})
+    with span("mongo.channels.find_one"):
+        channel = await db.catalog("channels").find_one({"id": channel_id, "is_active": True})
     if not channel:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -265,7 +625,8 @@ async def update_channel(
     current_user: User = Depends(get_current_user)
 ):
     # Find the channel
-    channel = await db.channels.find_one({"id": channel_id, "is_active": True})
+    with span("mongo.channels.find_one"):
+        channel = await db.channels.find_one({"id": channel_id, "is_active": True})
     if not channel:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -287,14 +648,33 @@ async def update_channel(
                 detail=f"Invalid URL: {url}"
             )
     
+    # Register new stream URLs before the update, release dropped ones after it. URLs
+    # are compared in normalized form but stored as submitted.
+    urls = dedupe_urls(channel_data.urls)
+    previous_urls = dedupe_urls(channel.get("urls", []))
+    current = {normalize_stream_url(url) for url in urls}
+    previous = {normalize_stream_url(url) for url in previous_urls}
+    added_urls = [url for url in urls if normalize_stream_url(url) not in previous]
+    await claim_channel_urls(channel_id, added_urls)
+    
     # Update channel
     update_data = channel_data.dict()
+    update_data["urls"] = urls
     update_data["updated_at"] = datetime.utcnow()
     
-    await db.channels.update_one(
-        {"id": channel_id},
-        {"$set": update_data}
-    )
+    try:
+        with span("mongo.channels.update_one"):
+            await db.channels.update_one(
+                {"id": channel_id},
+                {"$set": update_data}
+            )
+    except Exception:
+        await release_urls(db, channel_id, added_urls)
+        raise
+    with span("mongo.stream_urls.release"):
+        await release_urls(db, channel_id, [url for url in previous_urls if normalize_stream_url(url) not in current])
+    with span("event_bus.publish"):
+        await event_bus.publish("channels", {"action": "updated", "channel_id": channel_id})
     
     updated_channel = await db.channels.find_one({"id": channel_id})
     return ChannelResponse(**updated_channel)
@@ -305,7 +685,8 @@ async def delete_channel(
     current_user: User = Depends(get_current_user)
 ):
     # Find the channel
-    channel = await db.channels.find_one({"id": channel_id, "is_active": True})
+    with span("mongo.channels.find_one"):
+        channel = await db.channels.find_one({"id": channel_id, "is_active": True})
     if not channel:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -320,10 +701,15 @@ async def delete_channel(
         )
     
     # Soft delete
-    await db.channels.update_one(
-        {"id": channel_id},
-        {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
-    )
+    with span("mongo.channels.update_one"):
+        await db.channels.update_one(
+            {"id": channel_id},
+            {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+        )
+    with span("mongo.stream_urls.release"):
+        await release_urls(db, channel_id, channel.get("urls", []))
+    with span("event_bus.publish"):
+        await event_bus.publish("channels", {"action": "deleted", "channel_id": channel_id})
     
     return {"message": "Channel deleted successfully"}
 
@@ -357,9 +743,241 @@ async def get_my_channels(current_user: User = Depends(get_current_user)):
 
 @api_router.get("/categories")
 async def get_categories():
-    categories = await db.channels.distinct("category", {"is_active": True, "category": {"$ne": None}})
+    categories = await db.catalog("channels").distinct("category", {"is_active": True, "category": {"$ne": None}})
     return {"categories": categories}
 
+# EPG routes
+@api_router.get("/epg/now-next", response_model=List[NowNextResponse])
+async def get_now_next(channel_ids: str):
+    # Comma-separated ids for a page of catalog cards, answered by one aggregation
+    ids = [channel_id.strip() for channel_id in channel_ids.split(",") if channel_id.strip()]
+    if len(ids) > 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At most 200 channel ids per request"
+        )
+    with span("mongo.programmes.now_next", channels=len(ids)):
+        schedule = await fetch_now_next(db.catalog("programmes"), ids)
+    return [NowNextResponse(channel_id=channel_id, **schedule.get(channel_id, {})) for channel_id in ids]
+
+@api_router.get("/channels/{channel_id}/schedule", response_model=List[ProgrammeResponse])
+async def get_channel_schedule(channel_id: str, hours: int = 24):
+    now = datetime.utcnow()
+    with span("mongo.programmes.find", hours=hours):
+        programmes = await db.catalog("programmes").find(
+            {"channel_id": channel_id, "stop": {"$gt": now, "$lte": now + timedelta(hours=min(hours, 168))}},
+            {"_id": 0}
+        ).sort("stop", 1).to_list(1000)
+    return [ProgrammeResponse(**programme) for programme in programmes]
+
+@jobs.handler("epg_import")
+async def run_epg_import(context):
+    path = context.params["path"]
+    if not os.path.exists(path):
+        raise RuntimeError(
+            f"Spooled guide {path} not found on {socket.gethostname()}; "
+            f"it was uploaded to {context.params.get('host')}"
+        )
+    try:
+        with open(path, "rb") as handle:
+            result = await import_xmltv(db, handle, progress=context.progress)
+    except LeaseLost:
+        # Another worker re-claimed the job and is reading the same file
+        raise
+    except Exception:
+        # Keep the spooled guide for the retry unless this was the last attempt
+        if context.is_last_attempt and os.path.exists(path):
+            os.remove(path)
+        raise
+    os.remove(path)
+    return result
+
+@api_router.post("/admin/epg/import", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def import_epg(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_super_user)
+):
+    # Spool the upload to disk and import it from a background job. The guide lives on
+    # this host's local disk, so with JOB_STORE=mongo every worker that runs jobs must
+    # share it (a single host, or a shared temp directory via TMPDIR)
+    handle = tempfile.NamedTemporaryFile(prefix="epg-", suffix=".xml", delete=False)
+    with handle:
+        await run_in_threadpool(shutil.copyfileobj, file.file, handle)
+    job = await jobs.submit("epg_import", {"path": handle.name, "filename": file.filename, "host": socket.gethostname()})
+    return JobResponse(**job)
+
+# Job routes
+@api_router.get("/admin/jobs", response_model=List[JobResponse])
+async def list_jobs(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    limit: int = 100,
+    current_user: User = Depends(get_current_super_user)
+):
+    return [JobResponse(**job) for job in await jobs.store.list(status_filter, min(limit, 1000))]
+
+@api_router.get("/admin/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, current_user: User = Depends(get_current_super_user)):
+    job = await jobs.store.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return JobResponse(**job)
+
+# Recommendation routes
+@jobs.handler("build_recommendations")
+async def run_build_recommendations(context):
+    return await rebuild_recommendations(db, progress=context.progress)
+
+async def submit_unique_job(job_type: str) -> dict:
+    # Skip if one is already pending, e.g. submitted by another worker
+    for job_status in (QUEUED, RUNNING):
+        for job in await jobs.store.list(job_status):
+            if job["type"] == job_type:
+                return job
+    return await jobs.submit(job_type)
+
+async def schedule_recommendations():
+    while True:
+        await asyncio.sleep(RECOMMENDATIONS_REFRESH_SECONDS)
+        try:
+            await submit_unique_job("build_recommendations")
+        except Exception as exc:
+            logger.warning("Failed to schedule recommendations rebuild: %s", exc)
+
+@api_router.get("/channels/{channel_id}/similar", response_model=List[ChannelSummary])
+async def get_similar_channels(channel_id: str, limit: int = 10):
+    with span("mongo.channel_similar.find_one"):
+        similar = await db.catalog("channel_similar").find_one(
+            {"channel_id": channel_id},
+            {"_id": 0, "neighbours": {"$slice": min(limit, 100)}}
+        )
+    neighbour_ids = (similar or {}).get("neighbours", [])
+    channels = await fetch_channel_summaries(neighbour_ids)
+    return [channels[other] for other in neighbour_ids if other in channels]
+
+@api_router.get("/me/recommended", response_model=List[ChannelSummary])
+async def get_recommended(limit: int = 20, current_user: User = Depends(get_current_user)):
+    with span("mongo.user_library.find_one"):
+        library = await db.user_library.find_one({"user_id": current_user.id}, {"_id": 0}) or {}
+    seeds = [item["channel_id"] for item in library.get("recent", [])]
+    seeds += [channel_id for channel_id in library.get("favorites", []) if channel_id not in seeds]
+    if not seeds:
+        return []
+    with span("mongo.channel_similar.find_in", seeds=len(seeds)):
+        similar_docs = await db.catalog("channel_similar").find(
+            {"channel_id": {"$in": seeds}},
+            {"_id": 0, "channel_id": 1, "neighbours": 1, "scores": 1}
+        ).to_list(None)
+    with span("rank"):
+        ranked = rank_for_user(similar_docs, seeds, seeds, min(limit, 100))
+    channels = await fetch_channel_summaries(ranked)
+    return [channels[channel_id] for channel_id in ranked if channel_id in channels]
+
+@api_router.post("/admin/recommendations/rebuild", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_recommendations_admin(current_user: User = Depends(get_current_super_user)):
+    return JobResponse(**await submit_unique_job("build_recommendations"))
+
+# Stream URL index routes
+@api_router.get("/admin/stream-urls")
+async def get_stream_url_channels(url: str, current_user: User = Depends(get_current_super_user)):
+    if not validate_url(url):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid URL: {url}"
+        )
+    channel_ids = await channels_using(db, url)
+    channels = await fetch_channel_summaries(channel_ids)
+    return {
+        "url": normalize_stream_url(url),
+        "channels": [channels[channel_id] for channel_id in channel_ids if channel_id in channels],
+    }
+
+@jobs.handler("index_stream_urls")
+async def run_index_stream_urls(context):
+    return await rebuild_stream_url_index(db, progress=context.progress)
+
+async def ensure_stream_url_index():
+    # First start after upgrading: channels exist but the duplicate index was never built
+    if await db.stream_urls.find_one({}, {"_id": 1}):
+        return
+    if await db.channels.find_one({"is_active": True, "urls.0": {"$exists": True}}, {"_id": 1}):
+        job = await submit_unique_job("index_stream_urls")
+        logger.info("Stream URL index is empty, building it in job %s", job["id"])
+
+@api_router.post("/admin/stream-urls/reindex", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def reindex_stream_urls(current_user: User = Depends(get_current_super_user)):
+    return JobResponse(**await submit_unique_job("index_stream_urls"))
+
+# Per-user library routes
+@api_router.get("/me/favorites", response_model=List[ChannelSummary])
+async def get_favorites(current_user: User = Depends(get_current_user)):
+    with span("mongo.user_library.find_one"):
+        library = await db.user_library.find_one({"user_id": current_user.id}, {"_id": 0, "favorites": 1})
+    favorite_ids = (library or {}).get("favorites", [])
+    channels = await fetch_channel_summaries(favorite_ids)
+    return [channels[channel_id] for channel_id in favorite_ids if channel_id in channels]
+
+@api_router.put("/me/favorites/{channel_id}")
+async def add_favorite(channel_id: str, current_user: User = Depends(get_current_user)):
+    await get_active_channel_or_404(channel_id)
+    with span("mongo.user_library.update_one"):
+        await db.user_library.update_one(
+            {"user_id": current_user.id},
+            move_to_front("favorites", channel_id, channel_id, "$$item", MAX_FAVORITES),
+            upsert=True
+        )
+    return {"message": "Channel added to favorites"}
+
+@api_router.delete("/me/favorites/{channel_id}")
+async def remove_favorite(channel_id: str, current_user: User = Depends(get_current_user)):
+    with span("mongo.user_library.update_one"):
+        await db.user_library.update_one(
+            {"user_id": current_user.id},
+            {"$pull": {"favorites": channel_id}}
+        )
+    return {"message": "Channel removed from favorites"}
+
+@api_router.get("/me/recent", response_model=List[RecentChannel])
+async def get_recent(current_user: User = Depends(get_current_user)):
+    with span("mongo.user_library.find_one"):
+        library = await db.user_library.find_one({"user_id": current_user.id}, {"_id": 0, "recent": 1})
+    recent = (library or {}).get("recent", [])
+    channels = await fetch_channel_summaries([item["channel_id"] for item in recent])
+    return [
+        RecentChannel(**channels[item["channel_id"]].dict(), watched_at=item["watched_at"])
+        for item in recent if item["channel_id"] in channels
+    ]
+
+@api_router.post("/me/recent/{channel_id}")
+async def record_watch(channel_id: str, current_user: User = Depends(get_current_user)):
+    await get_active_channel_or_404(channel_id)
+    entry = {"channel_id": channel_id, "watched_at": datetime.utcnow()}
+    with span("mongo.user_library.update_one"):
+        await db.user_library.update_one(
+            {"user_id": current_user.id},
+            move_to_front("recent", entry, channel_id, "$$item.channel_id", MAX_RECENT),
+            upsert=True
+        )
+    return {"message": "Watch recorded"}
+
+@api_router.get("/me/library", response_model=UserLibraryResponse)
+async def get_library(current_user: User = Depends(get_current_user)):
+    # Favorites and recent history for the home screen, joined in a single $in query
+    with span("mongo.user_library.find_one"):
+        library = await db.user_library.find_one({"user_id": current_user.id}, {"_id": 0}) or {}
+    favorite_ids = library.get("favorites", [])
+    recent = library.get("recent", [])
+    channels = await fetch_channel_summaries(favorite_ids + [item["channel_id"] for item in recent])
+    return UserLibraryResponse(
+        favorites=[channels[channel_id] for channel_id in favorite_ids if channel_id in channels],
+        recent=[
+            RecentChannel(**channels[item["channel_id"]].dict(), watched_at=item["watched_at"])
+            for item in recent if item["channel_id"] in channels
+        ],
+    )
+
 # Super User Routes
 @api_router.post("/admin/users/{user_id}/make-super")
 async def make_super_user(
@@ -373,10 +991,13 @@ async def make_super_user(
             detail="User not found"
         )
     
-    await db.users.update_one(
-        {"id": user_id},
-        {"$set": {"is_super_user": True, "updated_at": datetime.utcnow()}}
-    )
+    with span("mongo.users.update_one"):
+        await db.users.update_one(
+            {"id": user_id},
+            {"$set": {"is_super_user": True, "updated_at": datetime.utcnow()}}
+        )
+    with span("event_bus.publish"):
+        await event_bus.publish("users", {"action": "updated", "user_id": user_id})
     
     return {"message": "User promoted to super user"}
 
@@ -390,6 +1011,10 @@ async def get_all_users_admin(current_user: User = Depends(get_current_super_use
     users = await db.users.find({}).sort("created_at", -1).to_list(1000)
     return [UserResponse(**user) for user in users]
 
+@api_router.get("/admin/db/pool")
+async def get_db_pool_stats(current_user: User = Depends(get_current_super_user)):
+    return db.pool_stats()
+
 # Basic routes
 @api_router.get("/")
 async def root():
@@ -399,9 +1024,24 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@api_router.get("/ready")
+async def readiness_check():
+    # Unlike /health, only succeeds once indexes, pool, crypt context and catalog cache are warm
+    report = startup_profiler.report()
+    if not startup_profiler.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=jsonable_encoder({"status": "starting", **report})
+        )
+    return {"status": "ready", **report}
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(TracingMiddleware, exporter=trace_exporter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -415,8 +1055,4 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+logger = logging.getLogger(__name__)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import importlib.abc
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# server.py imports this module first, so backend/.env is loaded before any other
+# backend module reads its settings at import time
+load_dotenv(Path(__file__).parent / '.env')
+
+logger = logging.getLogger(__name__)
+
+# Times every module import from here on, plus each startup step
+STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+
+class _TimedLoader:
+    def __init__(self, loader, timer: "ImportTimer", name: str):
+        self._loader = loader
+        self._timer = timer
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer.enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.exit()
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """Meta path hook recording inclusive and self time of each module import."""
+
+    def __init__(self):
+        self.records: List[dict] = []
+        self._stack: List[list] = []
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self, name)
+                return spec
+        return None
+
+    def enter(self, name: str):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        name, started, children = self._stack.pop()
+        inclusive = time.perf_counter() - started
+        if self._stack:
+            self._stack[-1][2] += inclusive
+        self.records.append({
+            "module": name,
+            "inclusive_ms": round(inclusive * 1000, 2),
+            "self_ms": round((inclusive - children) * 1000, 2),
+        })
+
+    def by_package(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for record in self.records:
+            package = record["module"].split(".")[0]
+            totals[package] = totals.get(package, 0.0) + record["self_ms"]
+        return {package: round(ms, 2) for package, ms in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+class StartupProfiler:
+    """Startup timings per component and a readiness flag for the worker."""
+
+    def __init__(self, profile_imports: bool = STARTUP_PROFILE):
+        self.started = time.perf_counter()
+        self.steps: Dict[str, float] = {}
+        self.ready = False
+        self.ready_after_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.import_timer = ImportTimer() if profile_imports else None
+        if self.import_timer is not None:
+            self.import_timer.install()
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = round((time.perf_counter() - started) * 1000, 2)
+
+    def imports_done(self):
+        self.steps["imports"] = round((time.perf_counter() - self.started) * 1000, 2)
+        if self.import_timer is not None:
+            self.import_timer.uninstall()
+
+    def mark_ready(self):
+        self.ready = True
+        self.error = None
+        self.ready_after_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        if self.import_timer is not None:
+            logger.info("Startup profile: %s", self.report())
+
+    def report(self, top: int = 20) -> dict:
+        report = {"ready": self.ready, "ready_after_ms": self.ready_after_ms, "steps": self.steps}
+        if self.error:
+            report["error"] = self.error
+        if self.import_timer is not None:
+            report["imports_by_package"] = dict(list(self.import_timer.by_package().items())[:top])
+            report["slowest_imports"] = sorted(
+                self.import_timer.records, key=lambda record: -record["self_ms"]
+            )[:top]
+        return report
+
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+from datetime import datetime
+from typing import Iterable, List
+from urllib.parse import urlsplit, urlunsplit
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# "reject" refuses a stream URL already registered by another channel, "allow" only indexes it
+DUPLICATE_STREAM_URLS = os.environ.get('DUPLICATE_STREAM_URLS', 'reject')
+
+_DEFAULT_PORTS = {"http": 80, "https": 443, "rtmp": 1935, "rtsp": 554}
+
+
+class StreamUrlConflict(Exception):
+    def __init__(self, url: str, channel_ids: List[str]):
+        super().__init__(url)
+        self.url = url
+        self.channel_ids = channel_ids
+
+
+def normalize_stream_url(url: str) -> str:
+    """Canonical form of a stream URL used for duplicate detection.
+
+    Scheme and host are lowercased, default ports, fragments and a trailing
+    slash are dropped, and query parameters are sorted. The path and the
+    query text keep their case and encoding since servers may treat them as
+    significant (signed tokens, ``+`` vs ``%20``, valueless flags).
+
+    Raises ValueError for a malformed or out-of-range port.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    port = parts.port
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if parts.username:
+        credentials = parts.username + (f":{parts.password}" if parts.password else "")
+        host = f"{credentials}@{host}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    # Sort the raw parameters without decoding them, so the rebuild is lossless
+    query = "&".join(sorted(segment for segment in parts.query.split("&") if segment))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(normalize_stream_url(url).encode("utf-8")).hexdigest()
+
+
+def dedupe_urls(urls: Iterable[str]) -> List[str]:
+    """Drop URLs that normalize to one already listed, keeping the first spelling and order.
+
+    URLs that cannot be normalized (stored before ports were validated) are
+    skipped; they were never registered in the index.
+    """
+    seen = set()
+    result = []
+    for url in urls:
+        try:
+            normalized = normalize_stream_url(url)
+        except ValueError:
+            logger.warning("Skipping invalid stream URL %r", url)
+            continue
+        if normalized not in seen:
+            seen.add(normalized)
+            result.append(url)
+    return result
+
+
+async def create_stream_url_indexes(db):
+    await db.stream_urls.create_index("url_hash", unique=True)
+    await db.stream_urls.create_index("channel_ids")
+
+
+async def claim_urls(db, channel_id: str, urls: List[str]):
+    """Register ``urls`` for a channel, keyed by the hash of their normalized form.
+
+    With the "reject" policy the update only matches entries no other channel
+    holds. For a URL owned elsewhere the upsert then collides with the unique
+    url_hash index, so concurrent writers cannot both register the same
+    upstream. Claims made before the conflicting URL are rolled back.
+    """
+    if not urls:
+        return
+    if DUPLICATE_STREAM_URLS == "reject":
+        owner_filter = {"channel_ids": {"$not": {"$elemMatch": {"$ne": channel_id}}}}
+    else:
+        owner_filter = {}
+    operations = [
+        UpdateOne(
+            {"url_hash": url_hash(url), **owner_filter},
+            {
+                "$set": {"url": normalize_stream_url(url), "updated_at": datetime.utcnow()},
+                "$addToSet": {"channel_ids": channel_id},
+            },
+            upsert=True,
+        )
+        for url in urls
+    ]
+    try:
+        await db.stream_urls.bulk_write(operations, ordered=True)
+    except (BulkWriteError, DuplicateKeyError) as exc:
+        details = getattr(exc, "details", None) or {}
+        errors = details.get("writeErrors", [])
+        failed_index = errors[0]["index"] if errors else 0
+        # Undo the claims that succeeded before the conflicting URL
+        await release_urls(db, channel_id, urls[:failed_index])
+        url = urls[failed_index]
+        existing = await db.stream_urls.find_one({"url_hash": url_hash(url)}, {"_id": 0, "channel_ids": 1})
+        owners = [other for other in (existing or {}).get("channel_ids", []) if other != channel_id]
+        raise StreamUrlConflict(url, owners)
+
+
+async def release_urls(db, channel_id: str, urls: List[str]):
+    if not urls:
+        return
+    hashes = [url_hash(url) for url in dedupe_urls(urls)]
+    await db.stream_urls.update_many({"url_hash": {"$in": hashes}}, {"$pull": {"channel_ids": channel_id}})
+    await db.stream_urls.delete_many({"url_hash": {"$in": hashes}, "channel_ids": {"$size": 0}})
+
+
+async def channels_using(db, url: str) -> List[str]:
+    entry = await db.stream_urls.find_one({"url_hash": url_hash(url)}, {"_id": 0, "channel_ids": 1})
+    return (entry or {}).get("channel_ids", [])
+
+
+async def rebuild_stream_url_index(db, progress=None) -> dict:
+    """Rebuild the index from the channels; duplicates found here are reported, not rejected.
+
+    The index stays in place while it is rebuilt: entries are upserted and
+    stamped, deleted channels are pulled, and only entries neither the
+    rebuild nor a concurrent claim touched are swept at the end.
+    """
+    started = datetime.utcnow()
+    channels = 0
+    inactive = []
+    operations = []
+    async for channel in db.channels.find({}, {"_id": 0, "id": 1, "urls": 1, "is_active": 1}):
+        if not channel.get("is_active"):
+            inactive.append(channel["id"])
+            continue
+        channels += 1
+        for url in dedupe_urls(channel.get("urls", [])):
+            operations.append(UpdateOne(
+                {"url_hash": url_hash(url)},
+                {
+                    "$set": {"url": normalize_stream_url(url), "updated_at": started},
+                    "$addToSet": {"channel_ids": channel["id"]},
+                },
+                upsert=True,
+            ))
+        if len(operations) >= 1000:
+            await db.stream_urls.bulk_write(operations, ordered=False)
+            operations = []
+            if progress is not None:
+                await progress({"channels": channels})
+    if operations:
+        await db.stream_urls.bulk_write(operations, ordered=False)
+
+    # Soft-deleted channels never claim again, so pulling them cannot race with a claim
+    for start in range(0, len(inactive), 1000):
+        chunk = inactive[start:start + 1000]
+        await db.stream_urls.update_many({"channel_ids": {"$in": chunk}}, {"$pull": {"channel_ids": {"$in": chunk}}})
+    await db.stream_urls.delete_many({"$or": [
+        {"updated_at": {"$lt": started}},
+        {"updated_at": {"$exists": False}},
+        {"channel_ids": {"$size": 0}},
+    ]})
+
+    stats = {
+        "channels": channels,
+        "distinct_urls": await db.stream_urls.count_documents({}),
+        "shared_urls": await db.stream_urls.count_documents({"channel_ids.1": {"$exists": True}}),
+    }
+    logger.info("Stream URL index rebuilt: %s", stats)
+    return stats
@@ -0,0 +1,305 @@
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', '').lower() in ('1', 'true', 'yes')
+# "file:<path>" writes OTLP-shaped JSON lines, "otlp:<url>" posts to an OTLP/HTTP collector
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', '')
+TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'live-streaming-backend')
+SLOW_REQUEST_MS = float(os.environ.get('TRACING_SLOW_REQUEST_MS', '500'))
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('TRACING_SLOW_SAMPLE_RATE', '1.0'))
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+    def breakdown(self, depth: int = 0) -> str:
+        lines = [f"{'  ' * depth}{self.name}: {self.duration_ms:.2f} ms"]
+        for child in self.children:
+            lines.append(child.breakdown(depth + 1))
+        return "\n".join(lines)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current request; a no-op when no trace is active."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id, attributes)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def parse_traceparent(value: Optional[str]):
+    # W3C trace context: version-traceid-parentid-flags
+    if not value:
+        return None, None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    return parts[1], parts[2]
+
+
+class BatchingExporter:
+    """Queues finished spans and writes them in batches from a background thread.
+
+    ``export`` never blocks the event loop; subclasses implement ``_write``.
+    The thread starts on the first export, in the process doing the export,
+    so building an exporter at import time is safe under pre-fork servers.
+    """
+
+    thread_name = "trace-exporter"
+
+    def __init__(self, batch_size: int = 256, flush_interval: float = 2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional["queue.Queue[Optional[Span]]"] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _running(self) -> bool:
+        # A thread inherited across fork() is not running in the child
+        return self._thread is not None and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            self._queue = queue.Queue(maxsize=10000)
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def export(self, spans: List[Span]):
+        self._ensure_started()
+        for item in spans:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                logger.warning("Trace export queue full, dropping spans")
+                return
+
+    def shutdown(self):
+        if not self._running():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item is None:
+                self._flush(batch)
+                return
+            if item is not False:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, batch: List[Span]):
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: List[Span]):
+        raise NotImplementedError
+
+
+class FileExporter(BatchingExporter):
+    thread_name = "file-trace-exporter"
+
+    def __init__(self, path: str, **kwargs):
+        self.path = path
+        super().__init__(**kwargs)
+
+    def _write(self, batch: List[Span]):
+        try:
+            with open(self.path, "a") as handle:
+                for item in batch:
+                    handle.write(json.dumps(item.to_otlp()) + "\n")
+        except OSError as exc:
+            logger.warning("Failed to write %d spans to %s: %s", len(batch), self.path, exc)
+
+
+class OTLPHttpExporter(BatchingExporter):
+    """Posts batches of spans as OTLP/HTTP JSON."""
+
+    thread_name = "otlp-exporter"
+
+    def __init__(self, endpoint: str, **kwargs):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        super().__init__(**kwargs)
+
+    def _write(self, batch: List[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": TRACING_SERVICE_NAME}},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "tracing"},
+                    "spans": [item.to_otlp() for item in batch],
+                }],
+            }]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception as exc:
+            logger.warning("Failed to export %d spans to %s: %s", len(batch), self.url, exc)
+
+
+def build_exporter(spec: str):
+    if spec.startswith("file:"):
+        return FileExporter(spec[len("file:"):])
+    if spec.startswith("otlp:"):
+        return OTLPHttpExporter(spec[len("otlp:"):])
+    if spec:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {spec}")
+    return None
+
+
+class TracingMiddleware:
+    """Opens a root span per HTTP request and exports the finished trace.
+
+    The trace id is taken from an incoming ``traceparent`` header when present
+    and returned in ``traceparent`` / ``X-Trace-Id`` response headers.
+    """
+
+    def __init__(self, app, enabled: bool = TRACING_ENABLED, exporter=None):
+        self.app = app
+        self.enabled = enabled
+        self.exporter = exporter if exporter is not None else (build_exporter(TRACING_EXPORTER) if enabled else None)
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        trace_id, parent_id = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        root = Span(
+            f"{scope['method']} {scope['path']}",
+            trace_id or secrets.token_hex(16),
+            parent_id,
+            {"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"traceparent", f"00-{root.trace_id}-{root.span_id}-01".encode("latin-1")),
+                    (b"x-trace-id", root.trace_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root.finish()
+            _current_span.reset(token)
+            self._record(root)
+
+    def _record(self, root: Span):
+        if self.exporter is not None:
+            try:
+                self.exporter.export(list(root.walk()))
+            except Exception as exc:
+                logger.warning("Failed to export trace %s: %s", root.trace_id, exc)
+        if root.duration_ms >= SLOW_REQUEST_MS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+            logger.warning("Slow request trace=%s\n%s", root.trace_id, root.breakdown())
@@ -0,0 +1,166 @@
+import asyncio
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compression
+from compression import CachedEntry, CompressedResponseCache, CompressionMiddleware, negotiate_encoding
+
+BODY = b'{"name": "channel"}' * 200
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    monkeypatch.setattr(compression, "available_encodings", lambda: ("gzip",))
+
+
+@pytest.fixture
+def all_encodings(monkeypatch):
+    monkeypatch.setattr(compression, "available_encodings", lambda: ("br", "zstd", "gzip"))
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("GZIP, deflate", "gzip"),
+    ("gzip;q=0.5, br;q=0.9", "br"),
+    ("br;q=0.5, zstd, gzip;q=0.5", "zstd"),
+    # Equal weights fall back to the server's preference order
+    ("gzip, zstd, br", "br"),
+    ("*", "br"),
+    ("*;q=0.1, gzip", "gzip"),
+    ("br;q=0, *", "zstd"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("gzip;q=bogus, deflate", None),
+])
+def test_negotiate_encoding(all_encodings, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def build_client():
+    async def large(request):
+        return Response(BODY, media_type="application/json")
+
+    async def small(request):
+        return Response(b"{}", media_type="application/json")
+
+    async def encoded(request):
+        return Response(gzip.compress(BODY), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+    async def streamed(request):
+        async def chunks():
+            yield BODY
+            yield BODY
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    app = Starlette(routes=[
+        Route("/large", large), Route("/small", small), Route("/encoded", encoded), Route("/streamed", streamed),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def test_middleware_compresses_large_bodies(gzip_only):
+    response = build_client().get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.content == BODY
+
+
+@pytest.mark.parametrize("path, accept", [
+    ("/large", "identity"),
+    ("/small", "gzip"),
+    ("/streamed", "gzip"),
+])
+def test_middleware_passes_through(gzip_only, path, accept):
+    response = build_client().get(path, headers={"Accept-Encoding": accept})
+
+    assert "content-encoding" not in response.headers
+    assert response.content.startswith(b"{")
+
+
+def test_middleware_leaves_encoded_responses_alone(gzip_only):
+    response = build_client().get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+    # Decoded once by the client: compressing again would leave gzip bytes here
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BODY
+
+
+def test_cached_entry_compresses_each_variant_once(monkeypatch):
+    calls = []
+
+    async def slow_compress(data, encoding, level=None):
+        calls.append(encoding)
+        await asyncio.sleep(0.01)
+        return b"compressed-" + encoding.encode()
+
+    monkeypatch.setattr(compression, "compress_async", slow_compress)
+    entry = CachedEntry(BODY, expires_at=0)
+
+    async def run():
+        return await asyncio.gather(*(entry.encoded("gzip", 1024) for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert calls == ["gzip"]
+    assert results == [(b"compressed-gzip", "gzip")] * 5
+
+
+def test_cached_entry_retries_after_a_failed_compression(monkeypatch):
+    attempts = []
+
+    async def flaky_compress(data, encoding, level=None):
+        attempts.append(encoding)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return b"ok"
+
+    monkeypatch.setattr(compression, "compress_async", flaky_compress)
+    entry = CachedEntry(BODY, expires_at=0)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await entry.encoded("gzip", 1024)
+        return await entry.encoded("gzip", 1024)
+
+    assert asyncio.run(run()) == (b"ok", "gzip")
+
+
+def test_cached_entry_skips_small_bodies_and_identity():
+    entry = CachedEntry(b"{}", expires_at=0)
+
+    assert asyncio.run(entry.encoded("gzip", 1024)) == (b"{}", None)
+    assert asyncio.run(CachedEntry(BODY, 0).encoded(None, 1024)) == (BODY, None)
+
+
+def test_cache_set_drops_entries_loaded_before_a_clear():
+    cache = CompressedResponseCache(ttl=60)
+    generation = cache.generation
+    cache.clear()  # a write invalidated the cache while the query ran
+
+    entry = cache.set("key", BODY, generation)
+
+    assert entry.body == BODY
+    assert cache.get("key") is None
+    cache.set("key", BODY, cache.generation)
+    assert cache.get("key") is not None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = CompressedResponseCache(ttl=60, max_entries=2)
+    cache.set("a", b"a")
+    cache.set("b", b"b")
+    cache.get("a")
+    cache.set("c", b"c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
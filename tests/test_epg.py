@@ -0,0 +1,115 @@
+import asyncio
+import gzip
+import io
+from datetime import datetime
+
+from epg import fetch_now_next, iter_programme_batches, parse_xmltv_time
+
+GUIDE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<tv>
+  <channel id="news.example">
+    <display-name>News 24</display-name>
+  </channel>
+  <channel id="unknown.example">
+    <display-name>Sports One</display-name>
+  </channel>
+  <programme start="20240101120000 +0000" stop="20240101130000 +0000" channel="news.example">
+    <title>Midday News</title>
+    <desc>Headlines</desc>
+    <category>News</category>
+  </programme>
+  <programme start="20240101130000 +0100" stop="20240101140000 +0100" channel="unknown.example">
+    <title>Match</title>
+  </programme>
+  <programme start="20240101140000 +0000" stop="20240101150000 +0000" channel="missing.example">
+    <title>Dropped</title>
+  </programme>
+  <programme start="bogus" stop="20240101150000 +0000" channel="news.example">
+    <title>No start</title>
+  </programme>
+</tv>
+"""
+
+CHANNEL_MAP = {"news.example": "channel-news", "sportsone": "channel-sports"}
+
+
+def test_parse_xmltv_time_converts_offsets_to_utc():
+    assert parse_xmltv_time("20240101120000 +0100") == datetime(2024, 1, 1, 11, 0)
+    assert parse_xmltv_time("20240101120000 -0230") == datetime(2024, 1, 1, 14, 30)
+    assert parse_xmltv_time("20240101120000") == datetime(2024, 1, 1, 12, 0)
+
+
+def test_parse_xmltv_time_rejects_missing_or_malformed_values():
+    assert parse_xmltv_time(None) is None
+    assert parse_xmltv_time("") is None
+    assert parse_xmltv_time("2024-01-01 12:00") is None
+
+
+def test_iter_programme_batches_resolves_channels_and_skips_unknown():
+    programmes = [programme for batch in iter_programme_batches(io.BytesIO(GUIDE), CHANNEL_MAP) for programme in batch]
+
+    assert [programme["title"] for programme in programmes] == ["Midday News", "Match"]
+    news, match = programmes
+    assert news["channel_id"] == "channel-news"
+    assert news["description"] == "Headlines"
+    assert news["category"] == "News"
+    # Resolved through the <channel> display name
+    assert match["channel_id"] == "channel-sports"
+    assert match["start"] == datetime(2024, 1, 1, 12, 0)
+    assert match["description"] is None
+
+
+def test_iter_programme_batches_respects_batch_size_and_gzip():
+    batches = list(iter_programme_batches(io.BytesIO(gzip.compress(GUIDE)), CHANNEL_MAP, batch_size=1))
+
+    assert [len(batch) for batch in batches] == [1, 1]
+
+
+class FakeProgrammes:
+    """Returns canned ``$group`` rows, as the aggregation would after sorting by stop."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield row
+
+
+def programme(title, start_hour, stop_hour):
+    return {"title": title, "start": datetime(2024, 1, 1, start_hour), "stop": datetime(2024, 1, 1, stop_hour)}
+
+
+def test_fetch_now_next_splits_current_and_following():
+    now = datetime(2024, 1, 1, 12, 30)
+    collection = FakeProgrammes([
+        {"_id": "airing", "programmes": [programme("Now", 12, 13), programme("Later", 13, 14)]},
+        {"_id": "gap", "programmes": [programme("Tonight", 18, 19), programme("Late", 19, 20)]},
+        {"_id": "last", "programmes": [programme("Final", 12, 13)]},
+    ])
+
+    schedule = asyncio.run(fetch_now_next(collection, ["airing", "gap", "last", "empty"], now=now))
+
+    assert schedule["airing"]["now"]["title"] == "Now"
+    assert schedule["airing"]["next"]["title"] == "Later"
+    # Nothing on air yet: the first upcoming programme is "next", not "now"
+    assert schedule["gap"]["now"] is None
+    assert schedule["gap"]["next"]["title"] == "Tonight"
+    assert schedule["last"]["now"]["title"] == "Final"
+    assert schedule["last"]["next"] is None
+    assert "empty" not in schedule
+    match = collection.pipelines[0][0]["$match"]
+    assert match["channel_id"] == {"$in": ["airing", "gap", "last", "empty"]}
+    assert match["stop"]["$gt"] == now
+
+
+def test_fetch_now_next_skips_the_query_without_channels():
+    collection = FakeProgrammes([])
+
+    assert asyncio.run(fetch_now_next(collection, [])) == {}
+    assert collection.pipelines == []
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import socket
+
+import pytest
+
+import events
+from events import RESYNC_TOPIC, LocalEventBus, SocketEventBus
+
+
+class RecordingBus(LocalEventBus):
+    """Local bus whose forwarded events are captured instead of sent anywhere."""
+
+    def __init__(self, fail=False):
+        super().__init__()
+        self.fail = fail
+        self.forwarded = []
+
+    async def _forward(self, event):
+        if self.fail:
+            raise ConnectionError("broker unreachable")
+        self.forwarded.append(event)
+
+
+def test_publish_dispatches_locally_and_forwards():
+    bus = RecordingBus()
+    received = []
+    bus.subscribe("channels", received.append)
+
+    asyncio.run(bus.publish("channels", {"action": "created"}))
+
+    assert received == [{"action": "created"}]
+    assert bus.forwarded == [{"topic": "channels", "payload": {"action": "created"}, "origin": bus.origin}]
+
+
+def test_own_echoes_are_dropped():
+    bus = RecordingBus()
+    received = []
+    bus.subscribe("channels", received.append)
+
+    bus._receive({"topic": "channels", "payload": {"from": "us"}, "origin": bus.origin})
+    bus._receive({"topic": "channels", "payload": {"from": "them"}, "origin": "another-worker"})
+
+    assert received == [{"from": "them"}]
+
+
+def test_failing_handler_does_not_block_others(caplog):
+    bus = RecordingBus()
+    received = []
+
+    def broken(payload):
+        raise KeyError("boom")
+
+    bus.subscribe("channels", broken)
+    bus.subscribe("channels", received.append)
+
+    with caplog.at_level(logging.WARNING, logger="events"):
+        asyncio.run(bus.publish("channels", {"id": 1}))
+
+    assert received == [{"id": 1}]
+    assert "Event handler for channels failed" in caplog.text
+
+
+def test_publish_logs_instead_of_raising_when_forwarding_fails(caplog):
+    bus = RecordingBus(fail=True)
+    received = []
+    bus.subscribe("channels", received.append)
+
+    with caplog.at_level(logging.WARNING, logger="events"):
+        asyncio.run(bus.publish("channels", {"id": 1}))
+
+    assert received == [{"id": 1}]
+    assert "Failed to forward channels event" in caplog.text
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until(condition, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def fast_reconnect(monkeypatch):
+    monkeypatch.setattr(events, "EVENT_BUS_RECONNECT_SECONDS", 0.05)
+
+
+def start_pair(port):
+    buses = [SocketEventBus(port=port), SocketEventBus(port=port)]
+    received = {0: [], 1: []}
+    for index, bus in enumerate(buses):
+        bus.subscribe("channels", received[index].append)
+        bus.subscribe(RESYNC_TOPIC, lambda payload, index=index: received[index].append("resync"))
+    return buses, received
+
+
+def test_socket_bus_delivers_across_workers_once(fast_reconnect):
+    async def main():
+        buses, received = start_pair(free_port())
+        for bus in buses:
+            await bus.start()
+        try:
+            await wait_until(lambda: all(bus._writer is not None for bus in buses))
+            await buses[1].publish("channels", {"id": 1})
+            await wait_until(lambda: {"id": 1} in received[0])
+            await asyncio.sleep(0.05)  # give the echo time to arrive
+        finally:
+            for bus in buses:
+                await bus.stop()
+        return buses, received
+
+    buses, received = asyncio.run(main())
+
+    assert buses[0]._server is not None and buses[1]._server is None
+    # Resync on connect, then the event; the publisher does not see its own echo twice
+    assert received[0] == ["resync", {"id": 1}]
+    assert received[1] == ["resync", {"id": 1}]
+
+
+def test_socket_bus_resyncs_after_the_broker_moves(fast_reconnect):
+    async def main():
+        buses, received = start_pair(free_port())
+        for bus in buses:
+            await bus.start()
+        try:
+            await wait_until(lambda: all(bus._writer is not None for bus in buses))
+            await buses[0].stop()  # the broker's worker exits
+            await wait_until(lambda: received[1].count("resync") == 2)
+            return buses[1]._server is not None
+        finally:
+            await buses[1].stop()
+
+    assert asyncio.run(main())
+
+
+def test_broker_disconnects_peers_that_fall_behind(fast_reconnect, monkeypatch):
+    monkeypatch.setattr(events, "EVENT_BUS_PEER_BUFFER_BYTES", -1)
+
+    async def main():
+        buses, received = start_pair(free_port())
+        for bus in buses:
+            await bus.start()
+        try:
+            await wait_until(lambda: all(bus._writer is not None for bus in buses))
+            await buses[1].publish("channels", {"id": 1})
+            # Every peer is over the (negative) limit: dropped, then reconnected with a resync
+            await wait_until(lambda: received[1].count("resync") >= 2)
+        finally:
+            for bus in buses:
+                await bus.stop()
+
+    asyncio.run(main())
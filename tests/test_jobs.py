@@ -0,0 +1,211 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobManager, MemoryJobStore, new_job
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL", 0.01)
+
+
+async def wait_for_status(store, job_id, statuses, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        assert asyncio.get_running_loop().time() < deadline, job
+        await asyncio.sleep(0.01)
+
+
+def run_jobs(setup, concurrency=1):
+    async def main():
+        store = MemoryJobStore()
+        manager = JobManager(store, concurrency=concurrency)
+        scenario = setup(manager)
+        await manager.start()
+        try:
+            return await scenario(store)
+        finally:
+            await manager.stop()
+    return asyncio.run(main())
+
+
+def test_job_succeeds_with_result_and_progress():
+    def setup(manager):
+        @manager.handler("count")
+        async def count(context):
+            await context.progress({"done": 1})
+            return {"total": context.params["n"]}
+
+        async def scenario(store):
+            job = await manager.submit("count", {"n": 3})
+            return await wait_for_status(store, job["id"], (SUCCEEDED, FAILED))
+        return scenario
+
+    job = run_jobs(setup)
+
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"total": 3}
+    assert job["progress"] == {"done": 1}
+    assert job["attempts"] == 1 and job["lease_until"] is None
+
+
+def test_failed_job_is_retried_then_marked_failed():
+    seen = []
+
+    def setup(manager):
+        @manager.handler("flaky")
+        async def flaky(context):
+            seen.append((context.job["attempts"], context.is_last_attempt))
+            raise ValueError("upstream down")
+
+        async def scenario(store):
+            job = await manager.submit("flaky", max_attempts=3)
+            return await wait_for_status(store, job["id"], (FAILED,))
+        return scenario
+
+    job = run_jobs(setup)
+
+    assert seen == [(1, False), (2, False), (3, True)]
+    assert job["error"] == "upstream down"
+    assert job["finished_at"] is not None
+
+
+def test_retry_recovers():
+    def setup(manager):
+        @manager.handler("second_time")
+        async def second_time(context):
+            if context.job["attempts"] == 1:
+                raise RuntimeError("transient")
+            return "ok"
+
+        async def scenario(store):
+            job = await manager.submit("second_time")
+            return await wait_for_status(store, job["id"], (SUCCEEDED, FAILED))
+        return scenario
+
+    job = run_jobs(setup)
+
+    assert job["status"] == SUCCEEDED and job["attempts"] == 2
+
+
+def test_stale_worker_cannot_overwrite_a_reclaimed_job():
+    def setup(manager):
+        @manager.handler("slow")
+        async def slow(context):
+            # Another worker re-claimed the job after this one's lease expired
+            manager.store._jobs[context.job["id"]]["attempts"] += 1
+            await context.progress("still going")
+            return "stale result"
+
+        async def scenario(store):
+            job = await manager.submit("slow")
+            await asyncio.sleep(0.1)
+            return await store.get(job["id"])
+        return scenario
+
+    job = run_jobs(setup)
+
+    # LeaseLost abandoned the handler: no progress, result or status change from the stale run
+    assert job["status"] == RUNNING
+    assert job["progress"] is None and job["result"] is None
+
+
+def test_memory_store_update_is_fenced_by_attempts():
+    async def main():
+        store = MemoryJobStore()
+        job = new_job("noop", {}, 3)
+        await store.insert(job)
+        claimed = await store.claim()
+        stale = await store.update(job["id"], {"status": SUCCEEDED}, attempts=claimed["attempts"] - 1)
+        current = await store.update(job["id"], {"progress": 1}, attempts=claimed["attempts"])
+        return stale, current, await store.get(job["id"])
+
+    stale, current, job = asyncio.run(main())
+
+    assert (stale, current) == (False, True)
+    assert job["status"] == RUNNING and job["progress"] == 1
+
+
+def test_memory_store_does_not_reclaim_running_jobs():
+    async def main():
+        store = MemoryJobStore()
+        await store.insert(new_job("noop", {}, 3))
+        first = await store.claim()
+        store._jobs[first["id"]]["lease_until"] = datetime.utcnow() - timedelta(seconds=1)
+        return await store.claim()
+
+    assert asyncio.run(main()) is None
+
+
+def test_cancelled_job_is_requeued():
+    started = []
+
+    async def main():
+        store = MemoryJobStore()
+        manager = JobManager(store, concurrency=1)
+
+        @manager.handler("long")
+        async def long(context):
+            started.append(context.job["id"])
+            await asyncio.sleep(10)
+
+        await manager.start()
+        job = await manager.submit("long")
+        while not started:
+            await asyncio.sleep(0.01)
+        await manager.stop()
+        return await store.get(job["id"])
+
+    job = asyncio.run(main())
+
+    assert job["status"] == QUEUED
+    assert job["attempts"] == 0 and job["lease_until"] is None
+
+
+def test_memory_store_prunes_finished_jobs():
+    async def main():
+        store = MemoryJobStore(history_limit=2)
+        ids = []
+        for _ in range(4):
+            job = new_job("noop", {}, 1)
+            ids.append(job["id"])
+            await store.insert(job)
+        pending = new_job("noop", {}, 1)
+        await store.insert(pending)
+        base = datetime.utcnow()
+        for index, job_id in enumerate(ids):
+            await store.update(job_id, {"status": SUCCEEDED, "finished_at": base + timedelta(seconds=index)})
+        return ids, pending["id"], {job["id"] for job in await store.list()}
+
+    ids, pending_id, remaining = asyncio.run(main())
+
+    # The two most recently finished jobs are kept; unfinished jobs are never pruned
+    assert remaining == {ids[2], ids[3], pending_id}
+
+
+def test_memory_store_expires_old_finished_jobs():
+    async def main():
+        store = MemoryJobStore()
+        old, recent = new_job("noop", {}, 1), new_job("noop", {}, 1)
+        await store.insert(old)
+        await store.insert(recent)
+        expired = datetime.utcnow() - timedelta(hours=jobs.JOB_RETENTION_HOURS + 1)
+        await store.update(old["id"], {"status": FAILED, "finished_at": expired})
+        await store.update(recent["id"], {"status": SUCCEEDED, "finished_at": datetime.utcnow()})
+        return await store.get(old["id"]), await store.get(recent["id"])
+
+    old, recent = asyncio.run(main())
+
+    assert old is None and recent is not None
+
+
+def test_submit_rejects_unknown_job_types():
+    with pytest.raises(ValueError):
+        asyncio.run(JobManager(MemoryJobStore()).submit("missing"))
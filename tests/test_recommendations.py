@@ -0,0 +1,77 @@
+import recommendations
+from recommendations import build_similarity, rank_for_user, tokenize
+
+
+def channel(channel_id, name, category=None, description=None):
+    return {"id": channel_id, "name": name, "category": category, "description": description}
+
+
+def test_tokenize_drops_stopwords_and_short_tokens():
+    assert tokenize("The Live Football Channel HD - a 24/7 show") == ["football", "show"]
+
+
+def test_build_similarity_ranks_shared_text_above_category_only():
+    channels = [
+        channel("a", "Premier Football", "Sports"),
+        channel("b", "Football Classics", "Sports"),
+        channel("c", "Tennis Open", "Sports"),
+        channel("d", "Cooking Daily", "Food"),
+    ]
+
+    neighbours = build_similarity(channels, [], top_k=5)
+
+    assert [other for other, _ in neighbours["a"]] == ["b", "c"]
+    scores = dict(neighbours["a"])
+    assert scores["b"] > scores["c"] == round(recommendations.CATEGORY_WEIGHT, 4)
+    # Nothing in common with anyone
+    assert neighbours["d"] == []
+
+
+def test_build_similarity_uses_cowatch_across_categories():
+    channels = [channel("a", "Evening News", "News"), channel("b", "Cartoon Hour", "Kids")]
+
+    neighbours = build_similarity(channels, [["a", "b"], ["a", "b", "gone"]], top_k=5)
+
+    assert neighbours["a"] == [("b", round(recommendations.COWATCH_WEIGHT, 4))]
+    # Co-watched channels that are no longer active are not recommended
+    assert all(other != "gone" for other, _ in neighbours["b"])
+
+
+def test_build_similarity_caps_large_categories(monkeypatch):
+    monkeypatch.setattr(recommendations, "MAX_CATEGORY_CANDIDATES", 10)
+    # Unique names: the category is the only thing these channels share
+    channels = [channel(f"c{index}", f"Band{index}", "Music") for index in range(50)]
+
+    neighbours = build_similarity(channels, [], top_k=3)
+
+    assert all(len(similar) == 3 for similar in neighbours.values())
+    # Only a window of the following members is compared, wrapping at the end
+    assert {other for other, _ in neighbours["c48"]} == {"c49", "c0", "c1"}
+
+
+def test_build_similarity_respects_top_k():
+    channels = [channel(f"c{index}", f"Station {index}", "Music") for index in range(10)]
+
+    neighbours = build_similarity(channels, [], top_k=4)
+
+    assert all(len(similar) == 4 for similar in neighbours.values())
+    assert all(channel_id not in dict(similar) for channel_id, similar in neighbours.items())
+
+
+def test_rank_for_user_weights_recent_seeds_and_excludes_seen():
+    similar_docs = [
+        {"channel_id": "recent", "neighbours": ["x", "y", "seen"], "scores": [0.5, 0.2, 0.9]},
+        {"channel_id": "older", "neighbours": ["y", "z"], "scores": [0.5, 0.45]},
+        {"channel_id": "stranger", "neighbours": ["w"], "scores": [1.0]},
+    ]
+
+    ranked = rank_for_user(similar_docs, ["recent", "older"], ["recent", "older", "seen"], limit=10)
+
+    # x: 0.5, y: 0.2 + 0.5 / 2, z: 0.45 / 2; the older seed counts half, non-seeds not at all
+    assert ranked == ["x", "y", "z"]
+
+
+def test_rank_for_user_limits_results():
+    similar_docs = [{"channel_id": "seed", "neighbours": ["a", "b", "c"], "scores": [0.3, 0.2, 0.1]}]
+
+    assert rank_for_user(similar_docs, ["seed"], ["seed"], limit=2) == ["a", "b"]
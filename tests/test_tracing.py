@@ -0,0 +1,116 @@
+import time
+
+import tracing
+from tracing import BatchingExporter, Span, _otlp_value, parse_traceparent, span
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID)
+    assert parse_traceparent(f"  00-{TRACE_ID}-{PARENT_ID}-00 ") == (TRACE_ID, PARENT_ID)
+
+
+def test_parse_traceparent_rejects_malformed_headers():
+    assert parse_traceparent(None) == (None, None)
+    assert parse_traceparent("") == (None, None)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}") == (None, None)
+    assert parse_traceparent(f"00-{TRACE_ID[:-1]}-{PARENT_ID}-01") == (None, None)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}0-01") == (None, None)
+
+
+def test_otlp_value_types():
+    # bool is checked before int, since True is an int
+    assert _otlp_value(True) == {"boolValue": True}
+    assert _otlp_value(3) == {"intValue": "3"}
+    assert _otlp_value(1.5) == {"doubleValue": 1.5}
+    assert _otlp_value("GET") == {"stringValue": "GET"}
+    assert _otlp_value(None) == {"stringValue": "None"}
+
+
+def test_span_to_otlp():
+    root = Span("GET /api/channels", TRACE_ID, PARENT_ID, {"http.status_code": 200})
+    root.finish()
+    encoded = root.to_otlp()
+
+    assert encoded["traceId"] == TRACE_ID
+    assert encoded["parentSpanId"] == PARENT_ID
+    assert int(encoded["endTimeUnixNano"]) >= int(encoded["startTimeUnixNano"])
+    assert encoded["attributes"] == [{"key": "http.status_code", "value": {"intValue": "200"}}]
+    assert "parentSpanId" not in Span("root", TRACE_ID).to_otlp()
+
+
+def test_span_nests_under_the_current_span():
+    with span("outside") as nothing:
+        assert nothing is None
+
+    root = Span("root", TRACE_ID)
+    token = tracing._current_span.set(root)
+    try:
+        with span("query", rows=1) as child:
+            with span("decode"):
+                pass
+    finally:
+        tracing._current_span.reset(token)
+
+    assert [item.name for item in root.walk()] == ["root", "query", "decode"]
+    assert child.parent_id == root.span_id and child.end_ns is not None
+
+
+class RecordingExporter(BatchingExporter):
+    def __init__(self, **kwargs):
+        self.batches = []
+        super().__init__(**kwargs)
+
+    def _write(self, batch):
+        self.batches.append([item.name for item in batch])
+
+
+def spans(*names):
+    return [Span(name, TRACE_ID) for name in names]
+
+
+def test_batching_exporter_flushes_full_batches():
+    exporter = RecordingExporter(batch_size=2, flush_interval=60)
+    exporter.export(spans("a", "b", "c"))
+    deadline = time.monotonic() + 2
+    while not exporter.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert exporter.batches == [["a", "b"]]
+    exporter.shutdown()
+    # Shutdown flushes the remainder
+    assert exporter.batches == [["a", "b"], ["c"]]
+
+
+def test_batching_exporter_flushes_on_interval():
+    exporter = RecordingExporter(batch_size=100, flush_interval=0.05)
+    exporter.export(spans("a"))
+    deadline = time.monotonic() + 2
+    while not exporter.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert exporter.batches == [["a"]]
+    exporter.shutdown()
+
+
+def test_file_exporter_writes_otlp_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.FileExporter(str(path), flush_interval=60)
+    exporter.export(spans("a", "b"))
+    exporter.shutdown()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2 and '"name": "a"' in lines[0]
+
+
+def test_batching_exporter_starts_its_thread_on_first_export():
+    exporter = RecordingExporter(flush_interval=60)
+    assert exporter._thread is None
+    exporter.shutdown()  # nothing to flush, nothing started
+
+    exporter.export(spans("a"))
+    assert exporter._thread is not None and exporter._thread.is_alive()
+    exporter.shutdown()
+    assert exporter.batches == [["a"]]